@@ -2,7 +2,10 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <array>
+#include <chrono>
 #include <cstdint>
+#include <span>
+#include <vector>
 
 namespace eval2048 {
 
@@ -15,7 +18,40 @@ enum class Move : std::uint8_t {
     NONE = 4,
 };
 constexpr std::size_t cellCount{16};
+// Sides of the boards evaluate_grid() accepts, see grid.hpp.
+constexpr std::size_t minSide{3};
+constexpr std::size_t maxSide{6};
 constexpr std::size_t lutEntries{UINT16_MAX + 1};
+constexpr std::uint64_t mcSimulations{200'000};
+
+using Clock = std::chrono::steady_clock;
+
+struct Budget {
+    std::uint64_t iterations{UINT64_MAX};
+    Clock::time_point deadline{Clock::time_point::max()};
+    constexpr bool timed() const { return deadline != Clock::time_point::max(); }
+};
+
+struct Result {
+    Move move{Move::NONE};
+    std::array<float, 4> scores{};         // Indexed by Move, 0 for illegal moves.
+    std::uint64_t iterations{};            // Simulations for MC, rollouts for MCTS, nodes for EXPMAX.
+    std::size_t depth{};                   // Deepest completed iteration, EXPMAX only.
+    double elapsed{};                      // Milliseconds.
+    std::array<std::uint64_t, 4> counts{}; // Rollouts (MC) or visits (MCTS) per root move.
+    std::array<float, 4> confidence{};     // Half-width of each score's confidence interval, MC only.
+};
+
+// Heuristic feature weights, see the heuristic library in eval.cpp.
+struct Weights {
+    float lost{200'000.0f}; // Offset keeping every live board above a lost one.
+    float empty{270.0f};
+    float merge{700.0f};
+    float mono{47.0f};
+    float sum{11.0f};
+    float smooth{0.0f};
+    float corner{0.0f};
+};
 
 struct LutEntry {
     std::uint16_t score{};
@@ -183,9 +219,48 @@ constexpr State move(const State s, const Move m, std::uint64_t &score) {
     };
 }
 
+// Features of one row or column of tile ranks, see the heuristic library in eval.cpp.
+struct RowFeatures {
+    float empty{};
+    float merge{};
+    float mono{};
+    float sum{};
+    float smooth{};
+    float corner{};
+};
+
+RowFeatures rowFeatures(const std::span<const std::uint8_t> ranks);
+float weigh(const Weights &w, const RowFeatures &f);
+
+class XorShift32 {
+  public:
+    explicit XorShift32(const std::uint32_t seed);
+    std::uint32_t operator()();
+
+  private:
+    std::uint32_t st;
+};
+
+State randTile(const State in, XorShift32 &rng);
+Result monteCarlo(const State state, const Budget budget, const std::size_t workers);
+
 } // namespace detail
 
+std::size_t getWorkers();
+void setWorkers(const std::size_t n);
+std::size_t getRolloutDepth();
+void setRolloutDepth(const std::size_t depth);
+Weights getWeights();
+void setWeights(const Weights &weights);
 Move evaluate(const std::array<std::uint16_t, cellCount> rstate, const std::uint8_t type);
-Move monteCarlo(const State state);
+Result evaluateTimed(const std::array<std::uint16_t, cellCount> rstate, const std::uint8_t type, const double budgetMs);
+Result evaluateGrid(const std::vector<std::uint32_t> &rstate, const std::uint8_t type, const double budgetMs);
+void evaluateBatch(
+    const std::span<const std::uint64_t> states, const std::uint8_t type, const std::span<Move> moves,
+    const std::span<std::array<float, 4>> scores
+);
+Result monteCarlo(const State state, const Budget budget);
+Result expectimax(const State state, const Budget budget);
+Result mcts(const State state, const Budget budget);
 
 } // namespace eval2048
\ No newline at end of file
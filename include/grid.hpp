@@ -0,0 +1,132 @@
+#pragma once
+#include "eval.hpp"
+#include <array>
+#include <cstdint>
+#include <vector>
+
+namespace eval2048 {
+
+/*
+    Boards of any side from minSide to maxSide, for variants of the game and for 4x4
+    boards past 32768 that no longer fit a nibble. Every cell takes 5 bits (tiles up
+    to 2^31) and every row is packed into its own 32-bit word, cell c of a row at bits
+    [5c, 5c + 5). The 64-bit State stays the fast path for the boards it can hold.
+*/
+constexpr std::size_t wideBits{5};
+constexpr std::uint32_t wideMask{(1u << wideBits) - 1};
+constexpr std::uint32_t maxRank{wideMask};
+
+template <std::size_t N> struct Grid {
+    static_assert(minSide <= N && N <= maxSide);
+    std::array<std::uint32_t, N> rows{};
+
+    constexpr std::uint8_t at(const std::size_t r, const std::size_t c) const {
+        return (rows[r] >> (c * wideBits)) & wideMask;
+    }
+    constexpr void set(const std::size_t r, const std::size_t c, const std::uint32_t rank) {
+        rows[r] = (rows[r] & ~(wideMask << (c * wideBits))) | (rank << (c * wideBits));
+    }
+    constexpr bool operator==(const Grid &) const = default;
+};
+
+namespace detail {
+
+// Rows packing at most this many bits are moved through a table, 1M entries at most.
+constexpr std::size_t rowTableBits{20};
+
+template <std::size_t N> constexpr bool tabled{N * wideBits <= rowTableBits};
+
+// Left move of a single row. Same as slide, merge, slide in initLut(), merges stop at maxRank.
+template <std::size_t N> constexpr std::uint32_t slideRow(const std::uint32_t row) {
+    std::array<std::uint32_t, N> ln{};
+    std::size_t n{0};
+    for (std::size_t c{0}; c < N; ++c) {
+        const std::uint32_t r{(row >> (c * wideBits)) & wideMask};
+        if (r != 0) {
+            ln[n++] = r;
+        }
+    }
+    std::uint32_t out{};
+    std::size_t k{0};
+    for (std::size_t i{0}; i < n; ++i) {
+        std::uint32_t r{ln[i]};
+        if (i + 1 < n && ln[i + 1] == r && r < maxRank) {
+            ++r;
+            ++i;
+        }
+        out |= r << (k++ * wideBits);
+    }
+    return out;
+}
+
+template <std::size_t N> const std::vector<std::uint32_t> &rowTable() {
+    static_assert(tabled<N>);
+    // Built on first use, at most 4MB. Too large (and too slow) to be constexpr.
+    static const std::vector<std::uint32_t> table{[] {
+        std::vector<std::uint32_t> out(std::size_t{1} << (N * wideBits));
+        for (std::uint32_t r{0}; r < out.size(); ++r) {
+            out[r] = slideRow<N>(r);
+        }
+        return out;
+    }()};
+    return table;
+}
+
+template <std::size_t N> constexpr Grid<N> transpose(const Grid<N> &g) {
+    Grid<N> out{};
+    for (std::size_t r{0}; r < N; ++r) {
+        for (std::size_t c{0}; c < N; ++c) {
+            out.rows[c] |= static_cast<std::uint32_t>(g.at(r, c)) << (r * wideBits);
+        }
+    }
+    return out;
+}
+
+template <std::size_t N> constexpr Grid<N> reverse(const Grid<N> &g) {
+    Grid<N> out{};
+    for (std::size_t r{0}; r < N; ++r) {
+        for (std::size_t c{0}; c < N; ++c) {
+            out.rows[r] |= static_cast<std::uint32_t>(g.at(r, c)) << ((N - 1 - c) * wideBits);
+        }
+    }
+    return out;
+}
+
+template <std::size_t N> Grid<N> mvL(const Grid<N> &g) {
+    Grid<N> out{};
+    for (std::size_t r{0}; r < N; ++r) {
+        if constexpr (tabled<N>) {
+            out.rows[r] = rowTable<N>()[g.rows[r]];
+        } else {
+            out.rows[r] = slideRow<N>(g.rows[r]);
+        }
+    }
+    return out;
+}
+
+template <std::size_t N> Grid<N> move(const Grid<N> &g, const Move m) {
+    switch (m) {
+    case Move::LEFT: return mvL(g);
+    case Move::RIGHT: return reverse(mvL(reverse(g)));
+    case Move::UP: return transpose(mvL(transpose(g)));
+    case Move::DOWN: return transpose(reverse(mvL(reverse(transpose(g)))));
+    case Move::NONE: return Grid<N>{};
+    };
+    return Grid<N>{};
+}
+
+template <std::size_t N> bool ended(const Grid<N> &g) {
+    for (std::size_t r{0}; r < N; ++r) {
+        for (std::size_t c{0}; c < N; ++c) {
+            const std::uint8_t v{g.at(r, c)};
+            if (v == 0 || (c + 1 < N && g.at(r, c + 1) == v) || (r + 1 < N && g.at(r + 1, c) == v)) {
+                return false;
+            }
+        }
+    }
+    return true;
+}
+
+} // namespace detail
+
+} // namespace eval2048
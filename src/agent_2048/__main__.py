@@ -1,8 +1,45 @@
+import argparse
+import logging
 from . import agent as agnt
 
 def main() -> None:
-    m_agnt : agnt.Agent = agnt.Agent()
-    m_agnt.run()
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="python -m agent_2048")
+    parser.add_argument(
+        "--record", type=str, default=None, help="record frames and states to this file"
+    )
+    parser.add_argument(
+        "--serial", action="store_true", help="run all stages on one thread"
+    )
+    parser.add_argument(
+        "--boards", type=int, default=1, help="number of boards on screen to play at once"
+    )
+    parser.add_argument(
+        "--side", type=int, default=4, help="cells per row of the boards, 3 to 6"
+    )
+    parser.add_argument(
+        "--headless", action="store_true", help="don't show the debug dashboard"
+    )
+    parser.add_argument(
+        "--dashboard-fps", type=float, default=10.0, help="most dashboard redraws per second"
+    )
+    args: argparse.Namespace = parser.parse_args()
+    m_agnt : agnt.Agent = agnt.Agent(
+        args.record,
+        boards=args.boards,
+        side=args.side,
+        headless=args.headless,
+        dashboard_fps=args.dashboard_fps,
+    )
+    try:
+        m_agnt.run(not args.serial)
+    finally:
+        if m_agnt.pipeline is not None:
+            logging.info(f"Pipeline: {m_agnt.pipeline.stats()}")
+        m_agnt.capture.stop()
+        m_agnt.dashboard.stop()
+        m_agnt.pool.shutdown(wait=False)
+        if m_agnt.recorder is not None:
+            m_agnt.recorder.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
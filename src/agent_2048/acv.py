@@ -1,13 +1,21 @@
+import os
 import cv2 as cv
 import numpy as np
 from cv2.typing import Rect
 from mss.base import MSSBase
 from mss.models import Monitor
 from .types import Image, Template, Symbol, CTopology, RectLayout
-from typing import Tuple, List, Any, Set
+from typing import Tuple, List, Any, Dict, Set
 from typing import NamedTuple
+from collections import OrderedDict
 
+GRID_SIDE_LENGTH: int = 4
 GRID_CLL_COUNT: int = 16
+GRID_PADDING: int = 10
+GRID_CRP: float = 0.015
+TMPLT_X: int = 32
+TMPLT_Y: int = 64
+SYMBOL_COUNT: int = 11
 
 
 def screen_cap(sct: MSSBase, b_rect: Rect) -> Image:
@@ -26,23 +34,22 @@ def screen_cap(sct: MSSBase, b_rect: Rect) -> Image:
     return scr
 
 
-def detect_grid(img: Image) -> Tuple[bool, Image, Rect]:
+def _grid_candidates(
+    img: Image, clearance: float, minimum: float, children: int
+) -> List[Rect]:
     """
-    Detects a 2048 grid on the display and returns the status, image, and location.
+    Square contours with at least `children` children, in contour order.
     """
-    CLEARANCE: float = 0.01
-    MINIMUM: float = 500.0
     CNNY_UPPER: float = 100.0
     CNNY_LOWER: float = 60.0
-    ASP_MIN: float = 1.0 - CLEARANCE
-    ASP_MAX: float = 1.0 + CLEARANCE
-    PADDING: int = 10
+    ASP_MIN: float = 1.0 - clearance
+    ASP_MAX: float = 1.0 + clearance
 
     # Filter by no. of children.
     cn: Image = cv.Canny(img, CNNY_LOWER, CNNY_UPPER)
     contours, hrchy = cv.findContours(cn, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE)
     if hrchy is None:
-        return (False, img, (-1, -1, -1, -1))
+        return []
     wch_msk: np.ndarray[Any, Any] = hrchy[0, :, CTopology.FIRST_CHILD] != CTopology.NULL
     hrchy_wch: np.ndarray[Any, Any] = hrchy[0, wch_msk]
     cnt_wch: List[np.ndarray[Any, Any]] = [
@@ -50,7 +57,7 @@ def detect_grid(img: Image) -> Tuple[bool, Image, Rect]:
     ]
     # There are times where 0 contours pass this filter.
     if not cnt_wch:
-        return (False, img, (-1, -1, -1, -1))
+        return []
     # Filter by aspect ratio.
     cnt_rect: np.ndarray[Any, Any] = np.array(
         [cv.boundingRect(cnt) for cnt in cnt_wch], dtype=np.float32
@@ -62,7 +69,7 @@ def detect_grid(img: Image) -> Tuple[bool, Image, Rect]:
         cnt_rect[:, RectLayout.WIDTH] / cnt_rect[:, RectLayout.HEIGHT]
     )
     sq_msk: np.ndarray[Any, Any] = ((ASP_MIN < cnt_asp) & (cnt_asp < ASP_MAX)) & (
-        cnt_arr > MINIMUM
+        cnt_arr > minimum
     )
     hrchy_sq: np.ndarray[Any, Any] = hrchy_wch[sq_msk]
     cnt_sq: np.ndarray[Any, Any] = cnt_rect[sq_msk]
@@ -74,50 +81,142 @@ def detect_grid(img: Image) -> Tuple[bool, Image, Rect]:
     # Filter by no. of children. Must be N <= 16.
     # Will be fooled by grids of the same dimensions but isn't the game.
     # But it isn't really a bad compromise.
-    grid_idx: int = -1
-    GRID_CELLS: int = GRID_CLL_COUNT
+    out: List[Rect] = []
     for i, h in enumerate(hrchy_sq):
         fchild: np.ndarray[Any, Any] = hrchy[0][h[CTopology.FIRST_CHILD]]
-        for _ in range(GRID_CELLS - 1):
+        for _ in range(children - 1):
             if fchild[CTopology.NEXT] == CTopology.NULL:
                 break
             fchild = hrchy[0][fchild[CTopology.NEXT]]
         else:
-            grid_idx = i
-            break
-    if grid_idx == -1:
-        return (False, img, (-1, -1, -1, -1))
-    gx, gy, gw, gh = [int(g) for g in cnt_sq[grid_idx]]
+            out.append(tuple(int(g) for g in cnt_sq[i]))
+    return out
+
+
+def _grid_at(img: Image, rect: Rect) -> Tuple[Image, Rect]:
+    gx, gy, gw, gh = rect
     scl_img: np.ndarray[Any, Any] = img[gy : gy + gh, gx : gx + gw, :]
     return (
-        True,
         scl_img,
-        (gx - PADDING // 2, gy - PADDING // 2, gw + PADDING, gh + PADDING),
+        (
+            gx - GRID_PADDING // 2,
+            gy - GRID_PADDING // 2,
+            gw + GRID_PADDING,
+            gh + GRID_PADDING,
+        ),
     )
 
 
+def overlap(a: Rect, b: Rect) -> float:
+    """
+    Area shared by two rectangles, relative to the smaller one.
+    """
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw: int = min(ax + aw, bx + bw) - max(ax, bx)
+    ih: int = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    return iw * ih / max(min(aw * ah, bw * bh), 1)
+
+
+def detect_grid(img: Image, side: int = GRID_SIDE_LENGTH) -> Tuple[bool, Image, Rect]:
+    """
+    Detects a 2048 grid of side x side cells on the display and returns the
+    status, image, and location.
+    """
+    CLEARANCE: float = 0.01
+    MINIMUM: float = 500.0
+
+    cnds: List[Rect] = _grid_candidates(img, CLEARANCE, MINIMUM, side * side)
+    if not cnds:
+        return (False, img, (-1, -1, -1, -1))
+    return (True, *_grid_at(img, cnds[0]))
+
+
+def locate_grid(img: Image, side: int = GRID_SIDE_LENGTH) -> Tuple[bool, Image, Rect]:
+    """
+    Same as detect_grid(), for whole screens. See locate_grids().
+    """
+    grids: List[Tuple[Image, Rect]] = locate_grids(img, 1, side)
+    if not grids:
+        return (False, img, (-1, -1, -1, -1))
+    return (True, *grids[0])
+
+
+def locate_grids(
+    img: Image, limit: int, side: int = GRID_SIDE_LENGTH
+) -> List[Tuple[Image, Rect]]:
+    """
+    Finds up to `limit` separate grids on a whole screen. Candidates are searched
+    on downsampled pyramid levels, coarsest first, and refined at full resolution.
+    """
+    COARSE_SIDE: int = 1024  # Longest side of the coarsest level searched.
+    CLEARANCE: float = 0.04  # Rounding of the downsampled edges.
+    FULL_CLEARANCE: float = 0.01  # Same as detect_grid().
+    MINIMUM: float = 500.0
+    # Cells can merge with each other once downsampled, 3/4 of them are enough.
+    CHILDREN: int = side * side * 3 // 4
+    SAME: float = 0.5  # Overlap of two contours of the same grid.
+
+    out: List[Tuple[Image, Rect]] = []
+
+    def add(grid: Image, loc: Rect) -> None:
+        if len(out) < limit and all(overlap(loc, o[1]) < SAME for o in out):
+            out.append((grid, loc))
+
+    scl: int = 1
+    while max(img.shape[:2]) > COARSE_SIDE * scl:
+        scl *= 2
+    if scl == 1:
+        for c in _grid_candidates(img, FULL_CLEARANCE, MINIMUM, side * side):
+            add(*_grid_at(img, c))
+        return out
+    # Finer levels only matter for grids too small to show up on coarser ones.
+    # Full resolution is never searched as a whole.
+    while scl > 1 and not out:
+        # The board is flat colored, so plain decimation keeps its edges sharp where
+        # a blurred pyramid (pyrDown) washes out the low contrast ones of empty cells.
+        lvl: Image = cv.resize(
+            img, None, fx=1 / scl, fy=1 / scl, interpolation=cv.INTER_NEAREST
+        )
+        cnds: List[Rect] = _grid_candidates(
+            lvl, CLEARANCE, MINIMUM / scl**2, CHILDREN
+        )
+        # The largest square with enough children is the board, not one of its tiles.
+        cnds.sort(
+            key=lambda c: c[RectLayout.WIDTH] * c[RectLayout.HEIGHT], reverse=True
+        )
+        for cx, cy, cw, ch in cnds:
+            if len(out) == limit:
+                break
+            m: int = 2 * scl + GRID_PADDING
+            x0, y0 = max(cx * scl - m, 0), max(cy * scl - m, 0)
+            x1, y1 = (cx + cw) * scl + m, (cy + ch) * scl + m
+            sts, grid, (x, y, w, h) = detect_grid(img[y0:y1, x0:x1], side)
+            if sts:
+                add(grid, (x + x0, y + y0, w, h))
+        scl //= 2
+    return out
+
+
 def crp(img: Image, prcnt: float) -> Image:
     cx, cy = int(img.shape[1] * prcnt), int(img.shape[0] * prcnt)
     w, h = img.shape[1], img.shape[0]
     return img[cx : w - cx, cy : h - cy]
 
 
-def detect_digits(grid: Image) -> Tuple[bool, List[Image]]:
+def detect_cells(grid: Image, side: int = GRID_SIDE_LENGTH) -> Tuple[bool, List[Rect]]:
     """
-    Detects and crops cells of the digits in the grid.
+    Detects the cells of the grid. Returns their rectangles within crp(grid, GRID_CRP)
+    in row-major order.
     """
     CNNY_UPPER: float = 100.0
     CNNY_LOWER: float = 60.0
-    CLL_CRP: float = 0.15
-    CLL_X_BIAS: int = 0
-    CLL_Y_BIAS: int = -1
-    INVERT_THRESHOLD: float = 128.0
     FILTER_THRESHOLD: float = 0.15
-    DEVIATION_THRESHOLD: float = 1.5
-    CLL_SCL_FCTR: int = 3
 
     # Preprocess grid and find cells, filter via area difference to largest contour.
-    cgrid: Image = crp(grid, 0.015)
+    cgrid: Image = crp(grid, GRID_CRP)
     cn: Image = cv.Canny(cgrid, CNNY_LOWER, CNNY_UPPER)
     cntrs, _ = cv.findContours(cn, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
     cells: List[Rect] = [cv.boundingRect(c) for c in cntrs]
@@ -137,26 +236,66 @@ def detect_digits(grid: Image) -> Tuple[bool, List[Image]]:
             e[RectLayout.X_COORD] // EDGE_TOLERANCE,
         )
     )
-    # Crop, adjust, and get average area.
+    # Cannot filter the noise from the data.
+    if len(fc) != side * side:
+        return (False, [])
+    return (True, fc)
+
+
+class Segment:
+    """
+    A binarized cell and the bounding boxes of its digits, left to right.
+    Signatures of the digits are computed on first use and then shared by
+    everything that looks at the cell.
+    """
+
+    def __init__(self, img: Image, boxes: List[Rect]) -> None:
+        self.img: Image = img
+        self.boxes: List[Rect] = boxes
+        self._sigs: np.ndarray[Any, Any] | None = None
+
+    def digit(self, k: int) -> Image:
+        """
+        The k-th digit resized to the template size.
+        """
+        x, y, w, h = self.boxes[k]
+        return cv.resize(self.img[y : y + h, x : x + w], (TMPLT_X, TMPLT_Y))
+
+    def sigs(self) -> np.ndarray[Any, Any]:
+        """
+        Recognizer.signature() of every digit, one row each.
+        """
+        if self._sigs is None:
+            self._sigs = np.zeros(
+                (len(self.boxes), TMPLT_X + TMPLT_Y), dtype=np.float32
+            )
+            for k in range(len(self.boxes)):
+                self._sigs[k] = Recognizer.signature(self.digit(k))
+        return self._sigs
+
+
+def crop_digits(grid: Image, cells: List[Rect]) -> List[Segment]:
+    """
+    Crops and binarizes the cells found by detect_cells(), then segments the
+    digits of all of them in a single connected components pass.
+    """
+    CLL_CRP: float = 0.15
+    CLL_X_BIAS: int = 0
+    CLL_Y_BIAS: int = -1
+    INVERT_THRESHOLD: float = 128.0
+    DEVIATION_THRESHOLD: float = 1.5
+
+    cgrid: Image = crp(grid, GRID_CRP)
     clpx: List[Image] = []
-    avg: float = 0.0
-    for i, cl in enumerate(fc):
+    for cl in cells:
         x, y, w, h = cl
         nw, nh = int(w * (1 - CLL_CRP)), int(h * (1 - CLL_CRP))
         nx, ny = x + ((w - nw) // 2), y + ((h - nh) // 2)
         nx += CLL_X_BIAS
         ny += CLL_Y_BIAS
-        fc[i] = (nx, ny, nw, nh)
-        avg += nw * nh
-    avg /= len(fc)
-
-    # Cannot filter the noise from the data.
-    if len(fc) != GRID_CLL_COUNT:
-        return (False, [])
-
-    for i, cl in enumerate(fc):
-        x, y, w, h = cl
-        cll_gscl: Image = cv.cvtColor(cgrid[y : y + h, x : x + w], cv.COLOR_RGB2GRAY)
+        cll_gscl: Image = cv.cvtColor(
+            cgrid[ny : ny + nh, nx : nx + nw], cv.COLOR_RGB2GRAY
+        )
         # Standard deviation is used to threshold empty cells.
         std_dev: float = float(np.std(cll_gscl))
         _, cth = (
@@ -172,22 +311,143 @@ def detect_digits(grid: Image) -> Tuple[bool, List[Image]]:
         m: float = float(np.mean(cth.astype(np.float32)))
         if m > INVERT_THRESHOLD:
             cth = cv.bitwise_not(cth)
-        clpx.append(
-            cv.resize(
-                cth,
-                (cth.shape[1] * CLL_SCL_FCTR, cth.shape[0] * CLL_SCL_FCTR),
-                interpolation=cv.INTER_LINEAR_EXACT,
-            )
-        )
+        clpx.append(cth)
+    if not clpx:
+        return []
+
+    # Cells side by side, one black column apart, so no component spans two of them.
+    offs: np.ndarray[Any, Any] = np.cumsum([0] + [c.shape[1] + 1 for c in clpx])
+    mosaic: Image = np.zeros(
+        (max(c.shape[0] for c in clpx), int(offs[-1])), dtype=np.uint8
+    )
+    for c, o in zip(clpx, offs):
+        mosaic[: c.shape[0], o : o + c.shape[1]] = c
+    _, _, stats, _ = cv.connectedComponentsWithStats(mosaic, connectivity=8)
+    # Background is label 0.
+    stats = stats[1:]
+    stats = stats[np.argsort(stats[:, cv.CC_STAT_LEFT], kind="stable")]
+    owner: np.ndarray[Any, Any] = (
+        np.searchsorted(offs, stats[:, cv.CC_STAT_LEFT], side="right") - 1
+    )
+    boxes: List[List[Rect]] = [[] for _ in clpx]
+    for (x, y, w, h, _), i in zip(stats.tolist(), owner.tolist()):
+        boxes[i].append((x - int(offs[i]), y, w, h))
+    return [Segment(c, b) for c, b in zip(clpx, boxes)]
+
 
-    if len(clpx) != GRID_CLL_COUNT:
+def detect_digits(
+    grid: Image, side: int = GRID_SIDE_LENGTH
+) -> Tuple[bool, List[Segment]]:
+    """
+    Detects and crops cells of the digits in the grid.
+    """
+    sts, cells = detect_cells(grid, side)
+    if not sts:
         return (False, [])
-    return (True, clpx)
+    return (True, crop_digits(grid, cells))
 
 
-TMPLT_X: int = 32
-TMPLT_Y: int = 64
-SYMBOL_COUNT: int = 11
+def _gap_mask(cgrid: Image, cells: List[Rect]) -> np.ndarray[Any, Any]:
+    """
+    Pixels of crp(grid, GRID_CRP) between the cells, which are board colored
+    whatever the tiles are.
+    """
+    MARGIN: int = 1  # Keeps anti-aliased tile edges out of the mask.
+
+    msk: np.ndarray[Any, Any] = np.zeros(cgrid.shape[:2], dtype=np.bool_)
+    bx0: int = min(c[RectLayout.X_COORD] for c in cells)
+    by0: int = min(c[RectLayout.Y_COORD] for c in cells)
+    bx1: int = max(c[RectLayout.X_COORD] + c[RectLayout.WIDTH] for c in cells)
+    by1: int = max(c[RectLayout.Y_COORD] + c[RectLayout.HEIGHT] for c in cells)
+    msk[by0:by1, bx0:bx1] = True
+    for cx, cy, cw, ch in cells:
+        msk[
+            max(cy - MARGIN, 0) : cy + ch + MARGIN,
+            max(cx - MARGIN, 0) : cx + cw + MARGIN,
+        ] = False
+    return msk
+
+
+def theme_key(grid: Image, cells: List[Rect]) -> Tuple[int, int, int] | None:
+    """
+    Fingerprint of the board's theme: the BGR color between its cells.
+    None for themes without gaps.
+    """
+    MIN_SAMPLES: int = 64
+
+    cgrid: Image = crp(grid, GRID_CRP)
+    px: np.ndarray[Any, Any] = cgrid[_gap_mask(cgrid, cells)]
+    if px.shape[0] < MIN_SAMPLES:
+        return None
+    b, g, r = (int(v) for v in np.median(px[:, :3], axis=0))
+    return (b, g, r)
+
+
+class Tracker:
+    """
+    Caches the grid and cell geometry of the last full detection so tracked
+    frames can be sliced directly. The cached geometry is trusted only while
+    the gaps between the cells, which stay board colored whatever the tiles
+    are, still match the frame it was acquired on.
+    """
+
+    def __init__(self) -> None:
+        self.shape: Tuple[int, ...] = ()
+        self.grid: Rect = (-1, -1, -1, -1)  # Within the capture.
+        self.cells: List[Rect] = []
+        self.gaps: Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]] = (
+            np.empty(0, dtype=np.intp),
+            np.empty(0, dtype=np.intp),
+        )
+        self.ref: np.ndarray[Any, Any] = np.empty(0, dtype=np.int16)
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def reset(self) -> None:
+        self.shape = ()
+
+    def acquire(self, env: Image, loc: Rect, cells: List[Rect]) -> None:
+        """
+        Caches the geometry found by detect_grid() and detect_cells() on env.
+        """
+        MAX_SAMPLES: int = 4096
+        MIN_SAMPLES: int = 64
+
+        x, y, w, h = loc
+        p: int = GRID_PADDING // 2
+        self.grid = (x + p, y + p, w - GRID_PADDING, h - GRID_PADDING)
+        self.cells = list(cells)
+        cgrid: Image = crp(self._grid(env), GRID_CRP)
+        rows, cols = np.nonzero(_gap_mask(cgrid, cells))
+        if rows.size < MIN_SAMPLES:
+            # Gapless themes leave nothing to check against.
+            self.reset()
+            return
+        step: int = max(1, rows.size // MAX_SAMPLES)
+        self.gaps = (rows[::step], cols[::step])
+        self.ref = cgrid[self.gaps].astype(np.int16)
+        self.shape = env.shape
+
+    def _grid(self, env: Image) -> Image:
+        x, y, w, h = self.grid
+        return env[y : y + h, x : x + w]
+
+    def track(self, env: Image) -> Tuple[bool, Image, List[Segment]]:
+        """
+        Returns the grid and digits of env if the cached geometry still holds.
+        """
+        GAP_THRESHOLD: float = 4.0
+
+        if env.shape != self.shape:
+            self.misses += 1
+            return (False, env, [])
+        grid: Image = self._grid(env)
+        gaps: np.ndarray[Any, Any] = crp(grid, GRID_CRP)[self.gaps].astype(np.int16)
+        if float(np.mean(np.abs(gaps - self.ref))) > GAP_THRESHOLD:
+            self.misses += 1
+            return (False, env, [])
+        self.hits += 1
+        return (True, grid, crop_digits(grid, self.cells))
 
 
 class Entry(NamedTuple):
@@ -196,7 +456,12 @@ class Entry(NamedTuple):
 
 
 class Recognizer:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        value_cache_size: int = 256,
+        value_cache_conf: float = 0.8,
+        value_cache_votes: int = 2,
+    ) -> None:
         self.bootstrapped: bool = False
         self.is_recognized: List[bool] = [False for _ in range(SYMBOL_COUNT)]
         rng: np.random.Generator = np.random.default_rng()
@@ -204,23 +469,134 @@ class Recognizer:
             rng.integers(0, np.iinfo(np.uint8).max, (TMPLT_Y, TMPLT_X), dtype=np.uint8)
             for _ in range(SYMBOL_COUNT)
         ]
-        self.templates: List[Template] = [
-            (
-                np.full(
-                    fill_value=np.finfo(np.float32).max,
-                    dtype=np.float32,
-                    shape=TMPLT_X // 2,
-                ),
-                np.full(
-                    fill_value=np.finfo(np.float32).max,
-                    dtype=np.float32,
-                    shape=TMPLT_Y // 2,
-                ),
+        # One signature() per symbol, stacked so a board is matched in one pass.
+        # Rows of unrecognized symbols are masked out in match_batch().
+        self.templates: np.ndarray[Any, Any] = np.zeros(
+            (SYMBOL_COUNT, TMPLT_X + TMPLT_Y), dtype=np.float32
+        )
+        # Fingerprints and results of the last recognition of each cell, by position.
+        self.cell_sigs: Dict[int, np.ndarray[Any, Any]] = {}
+        self.cell_vals: Dict[int, Tuple[int, float]] = {}
+        self.cell_hits: int = 0
+        self.cell_misses: int = 0
+        # Tile values by perceptual hash of the whole cell, least recently used first.
+        # Filled from matches at or above value_cache_conf and from add_template().
+        # An entry is only trusted once value_cache_votes labels agreed on it, so a
+        # single wrong label (a dropped key press) can't poison it.
+        self.value_cache: OrderedDict[Tuple[int, int], Tuple[int, float, int]] = (
+            OrderedDict()
+        )
+        self.value_cache_size: int = value_cache_size
+        self.value_cache_conf: float = value_cache_conf
+        self.value_cache_votes: int = value_cache_votes
+        self.value_hits: int = 0
+        self.value_misses: int = 0
+
+    def fingerprint(self, img: Image) -> np.ndarray[Any, Any]:
+        """
+        Downsampled signature of a thresholded cell image.
+        """
+        SIG_SIZE: Tuple[int, int] = (16, 16)
+        return cv.resize(img, SIG_SIZE, interpolation=cv.INTER_AREA).astype(np.int16)
+
+    def cached(self, i: int, sig: np.ndarray[Any, Any]) -> Tuple[int, float] | None:
+        """
+        Returns the previous result of cell i if its pixels haven't changed since.
+        """
+        SIG_THRESHOLD: float = 2.0
+        prev: np.ndarray[Any, Any] | None = self.cell_sigs.get(i)
+        if prev is None or float(np.mean(np.abs(sig - prev))) > SIG_THRESHOLD:
+            self.cell_misses += 1
+            return None
+        self.cell_hits += 1
+        return self.cell_vals[i]
+
+    def remember(
+        self, i: int, sig: np.ndarray[Any, Any], val: Tuple[int, float]
+    ) -> None:
+        self.cell_sigs[i] = sig
+        self.cell_vals[i] = val
+
+    def cell_hit_rate(self) -> float:
+        return self.cell_hits / max(self.cell_hits + self.cell_misses, 1)
+
+    def phash(self, img: Image) -> Tuple[int, int] | None:
+        """
+        Perceptual hash of a thresholded cell, and its content's aspect ratio
+        in quarters. None for empty cells.
+        """
+        DCT_SIZE: int = 32
+        HASH_SIZE: int = 8
+        x, y, w, h = cv.boundingRect(img)
+        if w == 0 or h == 0:
+            return None
+        nrm: Image = cv.resize(
+            img[y : y + h, x : x + w], (DCT_SIZE, DCT_SIZE), interpolation=cv.INTER_AREA
+        )
+        # Low frequencies without the DC term.
+        dct: np.ndarray[Any, Any] = cv.dct(nrm.astype(np.float32))
+        lf: np.ndarray[Any, Any] = dct[:HASH_SIZE, :HASH_SIZE].flatten()[1:]
+        bits: bytes = np.packbits(lf > np.median(lf)).tobytes()
+        return (int.from_bytes(bits, "big"), round(w / h * 4))
+
+    def lookup_value(self, key: Tuple[int, int]) -> Tuple[int, float] | None:
+        entry: Tuple[int, float, int] | None = self.value_cache.get(key)
+        if entry is None or entry[2] < self.value_cache_votes:
+            self.value_misses += 1
+            return None
+        self.value_hits += 1
+        self.value_cache.move_to_end(key)
+        return (entry[0], entry[1])
+
+    def learn_value(self, key: Tuple[int, int], val: Tuple[int, float]) -> None:
+        entry: Tuple[int, float, int] | None = self.value_cache.get(key)
+        if entry is not None and entry[0] == val[0]:
+            self.value_cache[key] = (val[0], max(entry[1], val[1]), entry[2] + 1)
+        else:
+            self.value_cache[key] = (val[0], val[1], 1)
+        self.value_cache.move_to_end(key)
+        while len(self.value_cache) > self.value_cache_size:
+            self.value_cache.popitem(last=False)
+
+    def value_hit_rate(self) -> float:
+        return self.value_hits / max(self.value_hits + self.value_misses, 1)
+
+    def save(self, path: str) -> None:
+        """
+        Writes the learned templates to path. The file is replaced atomically.
+        """
+        tmp: str = path + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                templates=self.templates,
+                images=np.stack(self.template_images),
+                recognized=np.array(self.is_recognized, dtype=np.bool_),
             )
-            for _ in range(SYMBOL_COUNT)
-        ]
+        os.replace(tmp, path)
 
-    def reduce(self, img: Image) -> Template:
+    def load(self, path: str) -> None:
+        """
+        Restores templates written by save(). Once the empty tile, 2 and 4
+        are known, bootstrap() isn't needed anymore.
+        """
+        with np.load(path) as data:
+            templates: np.ndarray[Any, Any] = data["templates"]
+            images: np.ndarray[Any, Any] = data["images"]
+            recognized: np.ndarray[Any, Any] = data["recognized"]
+        if templates.shape != self.templates.shape or len(recognized) != SYMBOL_COUNT:
+            raise ValueError(f"{path} is not a template profile.")
+        self.templates[:] = templates
+        self.template_images = list(images)
+        self.is_recognized = [bool(r) for r in recognized]
+        self.bootstrapped = all(
+            self.is_recognized[s] for s in (Symbol.EMPTY, Symbol.S2, Symbol.S4)
+        )
+        self.cell_sigs.clear()
+        self.value_cache.clear()
+
+    @staticmethod
+    def reduce(img: Image) -> Template:
         """
         Normalizes and reduces the image into a pixel density histogram for both axes.
         """
@@ -228,70 +604,68 @@ class Recognizer:
         x_dst: np.ndarray[Any, Any] = np.sum(img, axis=1, dtype=np.float32)
         return (y_dst / (np.sum(y_dst) + 10e-5), x_dst / (np.sum(x_dst) + 10e-5))
 
-    def _getsim(self, tmplt: Template, sym: Symbol) -> float:
-        if not self.is_recognized[sym]:
-            return 0.0
-        a: Template = tmplt
-        b: Template = self.templates[sym]
-        ly: float = np.sum(np.abs(a[0] - b[0]))
-        lx: float = np.sum(np.abs(a[1] - b[1])) 
-        return 1 - (ly + lx)
+    @staticmethod
+    def signature(img: Image) -> np.ndarray[Any, Any]:
+        """
+        Both density histograms of reduce() as a single vector.
+        """
+        return np.concatenate(Recognizer.reduce(img))
 
-    def match(self, img: Image) -> Tuple[int, float]:
+    def match(self, seg: Segment) -> Tuple[int, float]:
         """
         Returns the most likely match for any tile given.
         To be able to recognize new tiles, add_template() must
         be called before match().
         """
-        CNNY_UPPER: float = 180.0
-        CNNY_LOWER: float = 60.0
-        cny: Image = cv.Canny(img, CNNY_LOWER, CNNY_UPPER)
-        cntrs, _ = cv.findContours(cny, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        bboxes: List[Rect] = sorted(
-            [cv.boundingRect(c) for c in cntrs],
-            key=lambda e: e[RectLayout.X_COORD],
-        )
-
-        # Empty.
-        if len(bboxes) == 0:
-            return (0, 1.0)
+        return self.match_batch([seg])[0]
 
-        # Get similarity scores for each digit.
-        dgts: List[Tuple[int, float]] = []
-        for bbox in bboxes:
-            x, y, w, h = bbox
-            dgtsig: Template = self.reduce(
-                cv.resize(img[y : y + h, x : x + w], (TMPLT_X, TMPLT_Y))
-            )
-            sim: List[float] = [
-                self._getsim(dgtsig, Symbol(i)) for i in range(SYMBOL_COUNT)
-            ]
-            msym: int = max(range(10), key=lambda x: sim[x])
-            dgts.append((msym, sim[msym]))
-        pr = 0
-        for s, _ in dgts:
-            pr *= 10
-            pr += s
-        return (pr, min(dgts, key=lambda e: e[1])[1])
-
-    def add_template(self, img: Image, val: int) -> None:
+    def match_batch(self, segs: List[Segment]) -> List[Tuple[int, float]]:
         """
-        Parses an image and gets the constituent digits.
-        Updates internal templates based on value/label provided.
+        Same as match() for every cell, with the digits of all cells
+        matched against the templates in a single distance computation.
         """
-        CNNY_UPPER: float = 180.0
-        CNNY_LOWER: float = 60.0
-        cny: Image = cv.Canny(img, CNNY_LOWER, CNNY_UPPER)
-        cntrs, _ = cv.findContours(cny, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        bboxes: List[Rect] = sorted(
-            [cv.boundingRect(c) for c in cntrs],
-            key=lambda e: e[RectLayout.X_COORD],
-            reverse=True,
+        DIGIT_COUNT: int = 10
+
+        counts: List[int] = [len(sg.boxes) for sg in segs]
+        if not any(counts):
+            return [(0, 1.0) for _ in segs]
+        sigs: np.ndarray[Any, Any] = np.concatenate([sg.sigs() for sg in segs])
+
+        # (digits, symbols) similarity, 0 for symbols that haven't been learned yet.
+        sim: np.ndarray[Any, Any] = 1 - np.sum(
+            np.abs(sigs[:, np.newaxis, :] - self.templates[np.newaxis, :, :]),
+            axis=2,
         )
-        if len(bboxes) == 0 and not self.is_recognized[Symbol.EMPTY]:
+        sim[:, ~np.array(self.is_recognized)] = 0.0
+        msym: np.ndarray[Any, Any] = np.argmax(sim[:, :DIGIT_COUNT], axis=1)
+        msim: np.ndarray[Any, Any] = sim[np.arange(msym.size), msym]
+
+        out: List[Tuple[int, float]] = []
+        k: int = 0
+        for n in counts:
+            # Empty.
+            if n == 0:
+                out.append((0, 1.0))
+                continue
+            pr: int = 0
+            for s in msym[k : k + n]:
+                pr = pr * 10 + int(s)
+            out.append((pr, float(np.min(msim[k : k + n]))))
+            k += n
+        return out
+
+    def add_template(self, seg: Segment, val: int) -> None:
+        """
+        Updates internal templates from the digits of a segmented cell
+        based on value/label provided.
+        """
+        img: Image = seg.img
+        ndgt: int = len(seg.boxes)
+        if ndgt == 0 and not self.is_recognized[Symbol.EMPTY]:
             rsz_img: Image = cv.resize(img, (TMPLT_X, TMPLT_Y))
+            self.cell_sigs.clear()
             self.is_recognized[Symbol.EMPTY] = True
-            self.templates[Symbol.EMPTY] = self.reduce(rsz_img)
+            self.templates[Symbol.EMPTY] = self.signature(rsz_img)
             self.template_images[Symbol.EMPTY] = rsz_img
             return
         n: int = val
@@ -299,20 +673,33 @@ class Recognizer:
         # It NEEDS to check for this. (Took 5 hours to find this bug.)
         # This results in 0 getting polluted by the MSD of some random tile
         # whenever this invariant isn't met.
-        if len(str(n)) != len(bboxes):
+        if len(str(n)) != ndgt:
             return
-        for bbox in bboxes:
-            x, y, w, h = bbox
+        # Labels come from the predicted board and are wrong whenever a move didn't land
+        # as predicted. Only trust them where the matcher can't contradict them.
+        key: Tuple[int, int] | None = self.phash(img)
+        entry: Tuple[int, float, int] | None = (
+            self.value_cache.get(key) if key is not None else None
+        )
+        if key is not None and (
+            (entry is not None and entry[0] == val)
+            or not all(self.is_recognized[int(c)] for c in str(val))
+            or self.match(seg)[0] == val
+        ):
+            self.learn_value(key, (val, 1.0))
+        # Least significant digit first.
+        for k in reversed(range(ndgt)):
             c_digit: int = n % 10
             n //= 10
             if self.is_recognized[c_digit]:
                 continue
-            rsz_digit: Image = cv.resize(img[y : y + h, x : x + w], (TMPLT_X, TMPLT_Y))
-            self.templates[c_digit] = self.reduce(rsz_digit)
-            self.template_images[c_digit] = rsz_digit
+            # A new symbol can change what any cached cell would match to.
+            self.cell_sigs.clear()
+            self.templates[c_digit] = seg.sigs()[k]
+            self.template_images[c_digit] = seg.digit(k)
             self.is_recognized[c_digit] = True
 
-    def bootstrap(self, clls: List[Image]) -> None:
+    def bootstrap(self, clls: List[Segment]) -> None:
         """
         Bootstraps the recognizer on the digits.
         The image list MUST be clear, white on black,
@@ -325,11 +712,18 @@ class Recognizer:
 
         CNNY_UPPER: float = 180.0
         CNNY_LOWER: float = 60.0
+        # Holes of small digits can close up at capture resolution.
+        SCL_FCTR: int = 3
         unq_sym: int = 0
         rcgnz: List[bool] = [False for _ in range(3)]
         for dgt in clls:
+            scl: Image = cv.resize(
+                dgt.img,
+                (dgt.img.shape[1] * SCL_FCTR, dgt.img.shape[0] * SCL_FCTR),
+                interpolation=cv.INTER_LINEAR_EXACT,
+            )
             # Get raw contours, exclude empty tiles.
-            cnd: Image = cv.ximgproc.thinning(cv.Canny(dgt, CNNY_LOWER, CNNY_UPPER))
+            cnd: Image = cv.ximgproc.thinning(cv.Canny(scl, CNNY_LOWER, CNNY_UPPER))
             cccntrs, cchrchy = cv.findContours(
                 cnd, cv.RETR_TREE, cv.CHAIN_APPROX_SIMPLE
             )
@@ -390,28 +784,46 @@ class Recognizer:
 
 
 def get_state(
-    digits: List[Image], rcg: Recognizer
+    digits: List[Segment], rcg: Recognizer
 ) -> Tuple[bool, Tuple[Tuple[int, float], ...]]:
     """
-    Extracts the digits from the list of images.
+    Extracts the digits from the segmented cells.
     """
-    CNNY_UPPER: float = 180.0
-    CNNY_LOWER: float = 60.0
-
     # Handles setting internal variables.
     # only runs the first time it is called.
     rcg.bootstrap(digits)
 
+    # Only cells whose pixels changed since the last frame are looked at. Tiles seen
+    # before are known by their hash, the digits of the rest are matched in one batch.
+    sigs: List[np.ndarray[Any, Any]] = [rcg.fingerprint(d.img) for d in digits]
+    cached: List[Tuple[int, float] | None] = [
+        rcg.cached(i, s) for i, s in enumerate(sigs)
+    ]
+    pending: List[int] = [i for i, c in enumerate(cached) if c is None]
+    keys: Dict[int, Tuple[int, int] | None] = {i: rcg.phash(digits[i].img) for i in pending}
+    matched: Dict[int, Tuple[int, float]] = {}
+    for i in pending:
+        key: Tuple[int, int] | None = keys[i]
+        if key is None:
+            matched[i] = (0, 1.0)
+        elif (val := rcg.lookup_value(key)) is not None:
+            matched[i] = val
+    unknown: List[int] = [i for i in pending if i not in matched]
+    for i, val in zip(unknown, rcg.match_batch([digits[i] for i in unknown])):
+        matched[i] = val
+        key = keys[i]
+        out, sc = val
+        if key is not None and out & (out - 1) == 0 and sc >= rcg.value_cache_conf:
+            rcg.learn_value(key, val)
+
     state: List[Tuple[int, float]] = []
-    for d in digits:
-        cnd: Image = cv.Canny(d, CNNY_LOWER, CNNY_UPPER)
-        cntrs, _ = cv.findContours(cnd, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE)
-        d_count: int = len(cntrs)
-        if d_count == 0:
-            state.append((0, 1.0))
+    for i, c in enumerate(cached):
+        if c is not None:
+            state.append(c)
             continue
-        out, sc = rcg.match(d)
+        out, sc = matched[i]
         if out & (out - 1) != 0:
             return (False, tuple(state))
         state.append((out, float(sc)))
+        rcg.remember(i, sigs[i], state[-1])
     return (True, tuple(state))
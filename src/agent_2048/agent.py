@@ -1,29 +1,131 @@
-import mss
 import pyautogui
 import logging
+import os
 from pytweening import easeInOutQuad
 from pyautogui import leftClick, moveTo
 from pydirectinput import press
-from mss.base import MSSBase
 from cv2.typing import Rect
+from concurrent.futures import ThreadPoolExecutor
 from time import sleep, perf_counter
-from typing import Tuple, List
+from threading import Event
+from typing import Tuple, List, NamedTuple
 from .types import Image
-from .acv import screen_cap, detect_grid, detect_digits, get_state, Recognizer
-from .utils import show_dbg_state
-from .evl import get_move, Move
+from .acv import (
+    locate_grids,
+    detect_grid,
+    detect_cells,
+    crop_digits,
+    get_state,
+    overlap,
+    Recognizer,
+    Segment,
+    Tracker,
+    theme_key,
+)
+from .utils import Dashboard
+from .evl import get_move, Move, Ponderer
+from .book import Book
+from .bank import TemplateBank, ThemeKey
+from .cap import Capture, Frame, Source, MssSource, NO_REGION
+from .rec import Recorder, GRID_OK, DIGITS_OK, STATE_OK, MOVE_OK
+from .pipe import Pipeline
+
+
+class Step(NamedTuple):
+    """
+    What the stages know about one board in one frame. Capture buffers are
+    reused, so the grid is a copy and env is only kept (as a copy) while recording.
+    """
+
+    ts: float  # When the frame was grabbed.
+    status: int  # Stages that succeeded, as rec flags.
+    grid: Image
+    digits: List[Segment]
+    env: Image | None = None
+    state: Tuple[Tuple[int, float], ...] = ()
+    move: Move = Move.NONE
+    nstate: Tuple[int, ...] = ()
+    board: int = 0  # Index into Agent.boards.
+
+
+class Board:
+    """
+    One game on screen and what the agent knows about it. Boards are seen,
+    searched and played independently, only the capture and the input are shared.
+    """
+
+    def __init__(self, ponder_budget: float) -> None:
+        self.bRect: Rect = NO_REGION  # On screen.
+        self.tracked: bool = False
+        self.recognizer: Recognizer = Recognizer()
+        self.tracker: Tracker = Tracker()
+        self.ponderer: Ponderer = Ponderer(ponder_budget)
+        self.move_ts: float = 0.0  # Frames grabbed before the last move are stale.
+        self.seen_ts: float = -1.0  # Last frame whose board was recognized.
+        self.retry_ts: float = 0.0  # Left alone until then after a failure.
+        self.predicted_state: Tuple[int, ...] = ()
+        # The board predicted by the last move, and when that move was made.
+        self.predicted: Tuple[float, Tuple[int, ...]] = (0.0, ())
+        self.theme: ThemeKey | None = None
+        self.learned: int = 0  # Symbols known when the profile was last saved.
+        # A loaded profile is on trial until it recognizes a board. Fonts can differ
+        # between boards of the same colors.
+        self.trial: bool = False
+        self.trial_failures: int = 0
+
+    def waiting(self, stale: float) -> bool:
+        """
+        Whether the board hasn't been seen since its last move. A board seen more
+        than `stale` seconds ago without moving had its step dropped on the way.
+        """
+        return self.seen_ts < self.move_ts or perf_counter() - self.seen_ts > stale
+
+    def ready_ts(self) -> float:
+        return max(self.move_ts, self.retry_ts)
 
 
 class Agent:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        record: str | None = None,
+        source: Source | None = None,
+        boards: int = 1,
+        side: int = 4,
+        headless: bool = False,
+        dashboard_fps: float = 10.0,
+    ) -> None:
         self.LATENCY_ACTIVE: float = 0.0
         self.LATENCY_PASSIVE: float = 1.5
         self.LATENCY_ERROR: float = 0.05
-        self.sct: MSSBase = mss.mss()
-        self.bRect: Rect = (-1, -1, -1, -1)
-        self.tracked: bool = False
-        self.recognizer: Recognizer = Recognizer()
-        self.predicted_state: Tuple[int, ...] = ()
+        self.LATENCY_LOST: float = 0.05  # Between attempts to find a board.
+        # Between searches for missing boards while the others are played.
+        self.SEARCH_INTERVAL: float = 1.0
+        # Boards seen but not moved by then are seen again.
+        self.LATENCY_STALE: float = 1.0
+        self.MOVE_BUDGET: float = 40.0  # ms
+        self.GRID_SIDE: int = side  # Cells per row and column of the boards played.
+        self.PONDER_BUDGET: float = 10.0  # ms, per predicted board.
+        # Gliding to every board in turn would cost more than the moves themselves.
+        self.MOUSE_DURATION: float = 0.25 if boards == 1 else 0.0
+        self.capture: Capture = Capture(source if source is not None else MssSource())
+        self.capture.start()
+        self.moved: Event = Event()
+        self.boards: List[Board] = [Board(self.PONDER_BUDGET) for _ in range(boards)]
+        # Searches release the GIL, so boards are evaluated in parallel on threads.
+        self.pool: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=min(boards, os.cpu_count() or 1), thread_name_prefix="evaluate"
+        )
+        self.pipeline: Pipeline | None = None
+        self.DASHBOARD_FPS: float = dashboard_fps  # Most redraws per second.
+        self.dashboard: Dashboard = Dashboard(self.DASHBOARD_FPS, headless)
+        self.BOOK_PATH: str = os.path.join(os.path.expanduser("~"), ".agent_2048", "book.bin")
+        os.makedirs(os.path.dirname(self.BOOK_PATH), exist_ok=True)
+        self.book: Book = Book(self.BOOK_PATH)
+        self.TEMPLATES_PATH: str = os.path.join(os.path.dirname(self.BOOK_PATH), "templates")
+        self.PROFILE_RETRIES: int = 3
+        self.bank: TemplateBank = TemplateBank(self.TEMPLATES_PATH)
+        # Only the first board is recorded.
+        self.recorder: Recorder | None = Recorder(record) if record else None
         pyautogui.PAUSE = 0.01
         pyautogui.MINIMUM_SLEEP = 0.01
         pyautogui.MINIMUM_DURATION = 0.01
@@ -34,13 +136,15 @@ class Agent:
         )
         logging.info("Agent initialized...")
 
-    def _move(self, move: Move) -> None:
-        if not self.tracked:
+    def _move(self, bd: Board, move: Move) -> None:
+        if not bd.tracked:
             return
-        x, y, w, h = self.bRect
+        x, y, w, h = bd.bRect
         mx, my = pyautogui.position()
-        if not (x < mx < x + w and y < my < my + h):
-            moveTo(x + w // 2, y + h // 2, duration=0.25, tween=easeInOutQuad)
+        if not (x < mx < x + w and y < my < y + h):
+            moveTo(
+                x + w // 2, y + h // 2, duration=self.MOUSE_DURATION, tween=easeInOutQuad
+            )
         leftClick(duration=0.0)
         match move:
             case Move.UP:
@@ -52,7 +156,9 @@ class Agent:
             case Move.RIGHT:
                 press("right")
 
-    def _update_templates(self, nstate: Tuple[int, ...], images: List[Image]) -> None:
+    def _update_templates(
+        self, bd: Board, nstate: Tuple[int, ...], digits: List[Segment]
+    ) -> None:
         for i, tile in enumerate(nstate):
             # 0 CANNOT be passed to the recognizer. As 0 is an empty tile, and the recognizer treats
             # it as an actual digit to be learned. Bootstrapping already guarantees* that the empty tile
@@ -60,48 +166,278 @@ class Agent:
             # corrupted data.
             if tile == 0 or tile & (tile - 1) != 0:
                 continue
-            self.recognizer.add_template(images[i], tile)
-
-    def run(self) -> None:
-        error_n: int = 0
-        while True:
-            # Recognize.
-            rts: float = perf_counter()
-            env: Image = screen_cap(self.sct, self.bRect)  # 30~50ms
-            sts1, grid, loc = detect_grid(env)  # 5~7ms
+            bd.recognizer.add_template(digits[i], tile)
+
+    def _use_theme(self, bd: Board, grid: Image, cells: List[Rect]) -> None:
+        """
+        Switches to the templates of the board's theme, loading its saved profile
+        if there is one.
+        """
+        key: ThemeKey | None = theme_key(grid, cells)
+        if key is None:
+            return
+        if bd.theme is not None:
+            if max(abs(a - b) for a, b in zip(key, bd.theme)) <= self.bank.tolerance:
+                return
+            # Another board, its digits can look nothing like this one's.
+            bd.recognizer = Recognizer()
+        bd.theme = key
+        bd.learned = 0
+        profile: ThemeKey | None = self.bank.load(key, bd.recognizer)
+        bd.trial = profile is not None
+        bd.trial_failures = 0
+        if profile is not None:
+            # Saved back under the same name.
+            bd.theme = profile
+            bd.learned = sum(bd.recognizer.is_recognized)
+            logging.info(f"Loaded templates of theme {profile}.")
+
+    def _save_templates(self, bd: Board) -> None:
+        if bd.theme is None:
+            return
+        n: int = sum(bd.recognizer.is_recognized)
+        if n > bd.learned:
+            bd.learned = n
+            self.bank.save(bd.theme, bd.recognizer)
+
+    def _record(
+        self,
+        bd: Board,
+        env: Image | None,
+        status: int,
+        state: Tuple[Tuple[int, float], ...] = (),
+        move: Move = Move.NONE,
+    ) -> None:
+        if self.recorder is not None and env is not None and bd is self.boards[0]:
+            self.recorder.write(env, bd.bRect, state, move, status)
+
+    def _region(self) -> Rect:
+        """
+        Smallest region covering every board, or the whole screen while one is missing.
+        """
+        if not all(bd.tracked for bd in self.boards):
+            return NO_REGION
+        x0: int = min(bd.bRect[0] for bd in self.boards)
+        y0: int = min(bd.bRect[1] for bd in self.boards)
+        x1: int = max(bd.bRect[0] + bd.bRect[2] for bd in self.boards)
+        y1: int = max(bd.bRect[1] + bd.bRect[3] for bd in self.boards)
+        return (x0, y0, x1 - x0, y1 - y0)
+
+    def _acquire(self, frame: Frame) -> None:
+        """
+        Looks for the boards that aren't tracked. Only frames of the whole screen
+        are searched.
+        """
+        SAME: float = 0.5  # Overlap of a board found again.
+
+        free: List[Board] = [
+            bd for bd in self.boards if not bd.tracked and frame.ts >= bd.ready_ts()
+        ]
+        if not free:
+            return
+        if not all(v == -1 for v in frame.rect):
+            self.capture.set_region(NO_REGION)
+            return
+        known: List[Rect] = [bd.bRect for bd in self.boards if bd.tracked]
+        # Coarse to fine, 20~40ms even at 4K.
+        found: List[Rect] = [
+            loc
+            for _, loc in locate_grids(frame.img, len(self.boards), self.GRID_SIDE)
+            if all(overlap(loc, k) < SAME for k in known)
+        ]
+        for bd in free[len(found) :]:
+            bd.retry_ts = frame.ts + (self.SEARCH_INTERVAL if known else self.LATENCY_LOST)
+        if not found:
+            if not known and self.recorder is not None:
+                self._record(self.boards[0], frame.img.copy(), 0)
+            return
+        for bd, loc in zip(free, found):
+            logging.info("Board acquired.")
+            bd.bRect = loc
+            bd.tracked = True
+            bd.tracker.reset()
+            bd.retry_ts = 0.0
+        if all(bd.tracked for bd in self.boards):
+            self.capture.set_region(self._region())
+
+    def _board_env(self, frame: Frame, bd: Board) -> Image:
+        ox, oy = (0, 0) if all(v == -1 for v in frame.rect) else frame.rect[:2]
+        x, y, w, h = bd.bRect
+        return frame.img[max(y - oy, 0) : y - oy + h, max(x - ox, 0) : x - ox + w]
+
+    def _see(self, frame: Frame) -> List[Step] | None:
+        """
+        Vision stage: finds the boards in the frame and recognizes the tiles of
+        those that moved.
+        """
+        self._acquire(frame)
+        if not any(bd.tracked for bd in self.boards):
+            return [Step(frame.ts, 0, frame.img.copy(), [])]
+        steps: List[Step] = [
+            self._see_board(i, bd, frame)
+            for i, bd in enumerate(self.boards)
+            if bd.tracked
+            and bd.waiting(self.LATENCY_STALE)
+            and frame.ts >= bd.ready_ts()
+        ]
+        return steps or None
+
+    def _see_board(self, i: int, bd: Board, frame: Frame) -> Step:
+        env: Image = self._board_env(frame, bd)
+        # The capture buffer is reused once the next frame is taken.
+        snap: Image | None = env.copy() if self.recorder is not None and i == 0 else None
+        # Tracked boards are sliced with the cached cell geometry, detection only runs
+        # when the board moved or a move is still animating.
+        sts0, grid, digits = bd.tracker.track(env)
+        if not sts0:
+            sts1, grid, loc = detect_grid(env, self.GRID_SIDE)  # 5~7ms
             if not sts1:
                 logging.info("Board cannot be detected.")
-                self.bRect = (-1, -1, -1, -1)
-                self.tracked = False
-                show_dbg_state(None, self, rts, grid, [], False, Move.NONE)
-                sleep(self.LATENCY_PASSIVE)
-                continue
-            # Only reached whenever it acquires the board again.
-            if not self.tracked:
-                logging.info("Board acquired.")
-                self.bRect = loc
-                self.tracked = True
-            sts2, digits = detect_digits(grid)
+                self._record(bd, snap, 0)
+                bd.bRect = NO_REGION
+                bd.tracked = False
+                bd.tracker.reset()
+                bd.seen_ts = -1.0
+                self.capture.set_region(NO_REGION)
+                return Step(frame.ts, 0, grid.copy(), [], board=i)
+            sts2, cells = detect_cells(grid, self.GRID_SIDE)
             if not sts2:
                 logging.warning("Tiles cannot be disambiguated.")
-                show_dbg_state(None, self, rts, grid, [], False, Move.NONE)
-                sleep(self.LATENCY_PASSIVE)
-                continue
-            self._update_templates(self.predicted_state, digits)
-            sts3, state = get_state(digits, self.recognizer)
-            if not sts3:
-                logging.warning("Digits cannot be recognized.")
-                show_dbg_state(None, self, rts, grid, digits, False, Move.NONE)
-                sleep(self.LATENCY_PASSIVE)
-                continue
-            sts4, move, self.predicted_state = get_move(state)
-            if not sts4:
-                logging.warning("No valid moves detected.")
-                show_dbg_state(state, self, rts, grid, digits, False, move)
-                sleep(self.LATENCY_PASSIVE)
-                continue
-            logging.info(f"Move successful: {move.name}")
-            show_dbg_state(state, self, rts, grid, digits, True, move)
-            sleep(self.LATENCY_ACTIVE)
-            self._move(move)
-           
+                self._record(bd, snap, GRID_OK)
+                bd.retry_ts = perf_counter() + self.LATENCY_PASSIVE
+                return Step(frame.ts, GRID_OK, grid.copy(), [], board=i)
+            bd.tracker.acquire(env, loc, cells)
+            self._use_theme(bd, grid, cells)
+            digits = crop_digits(grid, cells)
+        # Labels only hold for frames taken after the move they were predicted for.
+        move_ts, predicted = bd.predicted
+        if frame.ts >= move_ts:
+            self._update_templates(bd, predicted, digits)
+        sts3, state = get_state(digits, bd.recognizer)
+        if not sts3:
+            logging.warning("Digits cannot be recognized.")
+            if bd.trial:
+                bd.trial_failures += 1
+                if bd.trial_failures >= self.PROFILE_RETRIES:
+                    logging.warning("Saved templates don't fit the board, relearning.")
+                    bd.recognizer = Recognizer()
+                    bd.trial = False
+                    bd.learned = 0
+            self._record(bd, snap, GRID_OK | DIGITS_OK)
+            bd.retry_ts = perf_counter() + self.LATENCY_PASSIVE
+            return Step(frame.ts, GRID_OK | DIGITS_OK, grid.copy(), digits, board=i)
+        bd.trial = False
+        self._save_templates(bd)
+        bd.seen_ts = frame.ts
+        ok: int = GRID_OK | DIGITS_OK | STATE_OK
+        return Step(frame.ts, ok, grid.copy(), digits, snap, state, board=i)
+
+    def _decide(self, steps: List[Step]) -> List[Step] | None:
+        """
+        Evaluation stage: searches the recognized boards, all of them at once.
+        """
+        out: List[Step] = [
+            s for s in self.pool.map(self._decide_board, steps) if s is not None
+        ]
+        return out or None
+
+    def _decide_board(self, step: Step) -> Step | None:
+        if not step.status & STATE_OK:
+            return step
+        bd: Board = self.boards[step.board]
+        # A move was made since the frame was grabbed.
+        if step.ts < bd.move_ts:
+            return None
+        sts4, move, nstate = get_move(step.state, self.MOVE_BUDGET, bd.ponderer, self.book)
+        if not sts4:
+            logging.warning("No valid moves detected.")
+            self._record(bd, step.env, step.status, step.state, move)
+            # Nothing will move, look at the board again later.
+            bd.retry_ts = perf_counter() + self.LATENCY_PASSIVE
+            bd.seen_ts = -1.0
+            return step._replace(move=move)
+        return step._replace(status=step.status | MOVE_OK, move=move, nstate=nstate)
+
+    def _act(self, steps: List[Step]) -> List[Step] | None:
+        """
+        Input stage: shows the steps and plays their moves, one board after another.
+        """
+        out: List[Step] = [s for s in map(self._act_board, steps) if s is not None]
+        return out or None
+
+    def _act_board(self, step: Step) -> Step | None:
+        bd: Board = self.boards[step.board]
+        ok: bool = bool(step.status & MOVE_OK)
+        if ok and step.ts < bd.move_ts:
+            return None
+        # There is one window, it follows the first board. Drawn on its own thread.
+        if step.board == 0:
+            self.dashboard.post(
+                step.state if step.status & STATE_OK else None,
+                bd,
+                step.ts,
+                step.grid,
+                step.digits,
+                ok,
+                step.move,
+            )
+        if not ok:
+            return step
+        logging.info(f"Move successful: {step.move.name}")
+        self._record(bd, step.env, step.status, step.state, step.move)
+        sleep(self.LATENCY_ACTIVE)
+        self._move(bd, step.move)
+        # Searches the likely next boards while the move animates and the next frame is captured.
+        bd.ponderer.start(step.nstate)
+        bd.predicted_state = step.nstate
+        now: float = perf_counter()
+        bd.predicted = (now, step.nstate)
+        bd.move_ts = now
+        self.moved.set()
+        return step
+
+    def _frame(self) -> Frame | None:
+        # One recognized board per move is enough, later frames of it would only keep
+        # vision busy when the frame after the next move arrives.
+        waiting: List[float] = [
+            bd.ready_ts() for bd in self.boards if bd.waiting(self.LATENCY_STALE)
+        ]
+        if self.pipeline is not None and self.pipeline.queues[0].full():
+            # Steps waiting for evaluation would be replaced by those of other boards.
+            sleep(0.002)
+            return None
+        if not waiting:
+            if self.moved.wait(0.1):
+                self.moved.clear()
+            return None
+        after: float = min(waiting)
+        if after > perf_counter():
+            # Every board is backing off, unless one of them moves meanwhile.
+            if self.moved.wait(after - perf_counter()):
+                self.moved.clear()
+            return None
+        # Grabbed in the background, only waits if no frame was taken since.
+        return self.capture.latest(after)
+
+    def run(self, pipelined: bool = True) -> None:
+        """
+        Plays until interrupted. Pipelined, capture, vision, evaluation and input
+        each run on their own thread so a move is limited by the slowest stage
+        rather than the sum of all of them.
+        """
+        if not pipelined:
+            while True:
+                frame: Frame | None = self._frame()
+                if frame is None:
+                    continue
+                steps: List[Step] | None = self._see(frame)
+                if steps is not None:
+                    steps = self._decide(steps)
+                if steps is not None:
+                    self._act(steps)
+        self.pipeline = Pipeline(
+            self._frame,
+            [("vision", self._see), ("evaluate", self._decide), ("input", self._act)],
+        )
+        self.pipeline.start()
+        self.pipeline.join()
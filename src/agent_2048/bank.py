@@ -0,0 +1,64 @@
+import os
+import re
+import zipfile
+from typing import List, Tuple
+from .acv import Recognizer
+
+type ThemeKey = Tuple[int, int, int]
+
+_NAME: re.Pattern[str] = re.compile(r"^([0-9a-f]{6})\.npz$")
+
+
+def _name(key: ThemeKey) -> str:
+    return "".join(f"{v:02x}" for v in key)
+
+
+class TemplateBank:
+    """
+    Templates learned per board theme, one profile file per theme in a
+    directory. Profiles are named after their theme_key() and found again by
+    the closest key, as captured colors can shift by a few levels.
+    """
+
+    def __init__(self, path: str, tolerance: int = 12) -> None:
+        self.path: str = path
+        self.tolerance: int = tolerance  # Largest channel difference of a match.
+        os.makedirs(path, exist_ok=True)
+
+    def keys(self) -> List[ThemeKey]:
+        out: List[ThemeKey] = []
+        for f in os.listdir(self.path):
+            m: re.Match[str] | None = _NAME.match(f)
+            if m is not None:
+                h: str = m.group(1)
+                out.append((int(h[0:2], 16), int(h[2:4], 16), int(h[4:6], 16)))
+        return out
+
+    def find(self, key: ThemeKey) -> ThemeKey | None:
+        """
+        Returns the key of the stored profile closest to key, if close enough.
+        """
+        best: ThemeKey | None = None
+        dist: int = self.tolerance + 1
+        for k in self.keys():
+            d: int = max(abs(a - b) for a, b in zip(k, key))
+            if d < dist:
+                best, dist = k, d
+        return best
+
+    def load(self, key: ThemeKey, rcg: Recognizer) -> ThemeKey | None:
+        """
+        Loads the profile matching key into rcg. Returns the key of the profile
+        loaded, None if there is none or it can't be read.
+        """
+        found: ThemeKey | None = self.find(key)
+        if found is None:
+            return None
+        try:
+            rcg.load(os.path.join(self.path, _name(found) + ".npz"))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+        return found
+
+    def save(self, key: ThemeKey, rcg: Recognizer) -> None:
+        rcg.save(os.path.join(self.path, _name(key) + ".npz"))
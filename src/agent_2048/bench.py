@@ -0,0 +1,119 @@
+import argparse
+import json
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Any, Dict, List
+from . import evl
+from .evl import Evaluation, Move
+from .sim import Game
+
+
+def play(seed: int, ev: int, budget: float, workers: int, max_moves: int) -> Dict[str, Any]:
+    """
+    Plays one complete game and returns its score, max tile and per-move latencies.
+    """
+    if evl.NATIVE:
+        evl.set_workers(workers)
+    game: Game = Game(seed)
+    latencies: List[float] = []
+    while not game.ended() and game.moves < max_moves:
+        st: float = perf_counter()
+        mv, _ = evl.search(game.tiles(), budget, Evaluation(ev))
+        latencies.append((perf_counter() - st) * 1000)
+        if mv == Move.NONE or not game.step(int(mv)):
+            break
+    return {
+        "score": game.score,
+        "moves": game.moves,
+        "max_tile": game.max_tile(),
+        "latencies": latencies,
+    }
+
+
+def summarize(games: List[Dict[str, Any]], wall: float) -> Dict[str, Any]:
+    PERCENTILES: List[int] = [50, 90, 99]
+    scores: np.ndarray[Any, Any] = np.array([g["score"] for g in games], dtype=np.float64)
+    lat: np.ndarray[Any, Any] = np.concatenate(
+        [np.asarray(g["latencies"], dtype=np.float64) for g in games]
+    )
+    tiles: np.ndarray[Any, Any] = np.array([g["max_tile"] for g in games])
+    moves: int = sum(g["moves"] for g in games)
+    reached: Dict[str, float] = {}
+    tile: int = 2
+    while tile <= tiles.max():
+        reached[str(tile)] = float(np.mean(tiles >= tile))
+        tile *= 2
+    return {
+        "games": len(games),
+        "moves": moves,
+        "wall_s": wall,
+        "moves_per_s": moves / wall if wall > 0 else 0.0,
+        "latency_ms": {
+            **{f"p{p}": float(np.percentile(lat, p)) for p in PERCENTILES},
+            "mean": float(np.mean(lat)),
+            "max": float(np.max(lat)),
+        }
+        if lat.size
+        else {},
+        "score": {
+            "mean": float(np.mean(scores)),
+            "std": float(np.std(scores)),
+            "min": float(np.min(scores)),
+            "median": float(np.median(scores)),
+            "max": float(np.max(scores)),
+        },
+        "max_tile_rate": reached,
+    }
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m agent_2048.bench",
+        description="Plays headless games and reports evaluator speed and strength as JSON.",
+    )
+    parser.add_argument("-n", "--games", type=int, default=16)
+    parser.add_argument("-m", "--mode", choices=list(Evaluation.__members__), default="AUTO")
+    parser.add_argument("-b", "--budget", type=float, default=40.0, help="ms per move")
+    parser.add_argument("-p", "--procs", type=int, default=None, help="worker processes")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="search threads per process")
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("--max-moves", type=int, default=100_000)
+    parser.add_argument("-o", "--out", type=str, default=None, help="output file, stdout if omitted")
+    args: argparse.Namespace = parser.parse_args()
+
+    ev: int = int(Evaluation.__members__[args.mode])
+    st: float = perf_counter()
+    with ProcessPoolExecutor(max_workers=args.procs) as pool:
+        games: List[Dict[str, Any]] = list(
+            pool.map(
+                play,
+                range(args.seed, args.seed + args.games),
+                [ev] * args.games,
+                [args.budget] * args.games,
+                [args.workers] * args.games,
+                [args.max_moves] * args.games,
+            )
+        )
+    report: Dict[str, Any] = {
+        "config": {
+            "mode": args.mode,
+            "budget_ms": args.budget,
+            "procs": args.procs,
+            "workers": args.workers,
+            "seed": args.seed,
+            "native": evl.NATIVE,
+        },
+        **summarize(games, perf_counter() - st),
+    }
+    out: str = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        sys.stdout.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import os
+import numpy as np
+from threading import Lock
+from typing import Any, List, Tuple
+from . import eng
+
+MAGIC: bytes = b"A2048BK1"
+WAYS: int = 8  # Slots per bucket, the least recently used one is evicted.
+ENTRY: np.dtype[Any] = np.dtype(
+    [
+        ("key", "<u8"),  # Canonical packed board, 0 marks a free slot.
+        ("stamp", "<u8"),  # Clock of the last store or lookup.
+        ("score", "<f4"),  # Running mean of the best move's score.
+        ("count", "<u4"),  # Number of searches folded into score.
+        ("move", "u1"),  # Best move on the canonical board.
+        ("pad", "u1", (7,)),
+    ]
+)
+HEADER: np.dtype[Any] = np.dtype(
+    [("magic", "S8"), ("capacity", "<u8"), ("clock", "<u8"), ("pad", "u1", (8,))]
+)
+
+# The 8 board symmetries as sequences of reverse (R) and transpose (T),
+# with how each one permutes moves indexed by Move value.
+_R_MV: Tuple[int, ...] = (0, 1, 3, 2)  # LEFT <-> RIGHT.
+_T_MV: Tuple[int, ...] = (2, 3, 0, 1)  # UP <-> LEFT, DOWN <-> RIGHT.
+SYMMETRIES: Tuple[str, ...] = ("", "R", "T", "RT", "TR", "RTR", "TRT", "RTRT")
+
+
+def _symmetry_moves(seq: str) -> Tuple[int, ...]:
+    perm: List[int] = [0, 1, 2, 3]
+    for op in seq:
+        perm = [(_R_MV if op == "R" else _T_MV)[m] for m in perm]
+    return tuple(perm)
+
+
+_FWD: Tuple[Tuple[int, ...], ...] = tuple(_symmetry_moves(s) for s in SYMMETRIES)
+
+
+def canonical(board: int) -> Tuple[int, int]:
+    """
+    Reduces a packed board to the smallest of its 8 symmetric forms.
+    Returns the canonical board and the index of the symmetry used.
+    """
+    b: np.ndarray[Any, Any] = np.full(len(SYMMETRIES), board, dtype=np.uint64)
+    for i, seq in enumerate(SYMMETRIES):
+        for op in seq:
+            b[i] = eng.reverse(b[i]) if op == "R" else eng.transpose(b[i])
+    i: int = int(np.argmin(b))
+    return (int(b[i]), i)
+
+
+class Book:
+    """
+    Persistent position cache keyed by canonical packed boards. The file is
+    memory-mapped and laid out as a set-associative table, so its size is fixed
+    at creation. Opening it read-only lets several agents share one file.
+    One Book can be used from several threads.
+    """
+
+    def __init__(self, path: str, capacity: int = 1 << 20, readonly: bool = False) -> None:
+        self.readonly: bool = readonly
+        if not os.path.exists(path):
+            if readonly:
+                raise FileNotFoundError(path)
+            self._create(path, capacity)
+        self._header: np.memmap[Any, Any] = np.memmap(
+            path, dtype=HEADER, mode="r" if readonly else "r+", shape=(1,)
+        )
+        if self._header[0]["magic"] != MAGIC:
+            raise ValueError(f"{path} is not a position book.")
+        self.capacity: int = int(self._header[0]["capacity"])
+        self._entries: np.memmap[Any, Any] = np.memmap(
+            path,
+            dtype=ENTRY,
+            mode="r" if readonly else "r+",
+            offset=HEADER.itemsize,
+            shape=(self.capacity // WAYS, WAYS),
+        )
+        self._bits: int = (self.capacity // WAYS).bit_length() - 1
+        self.hits: int = 0
+        self.misses: int = 0
+        self._lock: Lock = Lock()
+
+    @staticmethod
+    def _create(path: str, capacity: int) -> None:
+        # Rounded down to a power of 2 buckets.
+        buckets: int = 1 << ((max(capacity, WAYS) // WAYS).bit_length() - 1)
+        header: np.ndarray[Any, Any] = np.zeros(1, dtype=HEADER)
+        header[0]["magic"] = MAGIC
+        header[0]["capacity"] = buckets * WAYS
+        with open(path, "wb") as f:
+            f.write(header.tobytes())
+            f.truncate(HEADER.itemsize + buckets * WAYS * ENTRY.itemsize)
+
+    def _bucket(self, key: int) -> np.ndarray[Any, Any]:
+        h: int = ((key * 0x9E37_79B9_7F4A_7C15) & 0xFFFF_FFFF_FFFF_FFFF) >> (64 - self._bits)
+        return self._entries[h if self._bits > 0 else 0]
+
+    def _tick(self) -> int:
+        clk: int = int(self._header[0]["clock"]) + 1
+        self._header[0]["clock"] = clk
+        return clk
+
+    def lookup(self, board: int) -> Tuple[int, float, int] | None:
+        """
+        Returns the best move, mean score and search count for a packed board.
+        """
+        key, sym = canonical(board)
+        bucket: np.ndarray[Any, Any] = self._bucket(key)
+        with self._lock:
+            slot: np.ndarray[Any, Any] = np.flatnonzero(bucket["key"] == key)
+            if slot.size == 0:
+                self.misses += 1
+                return None
+            self.hits += 1
+            e: np.ndarray[Any, Any] = bucket[slot[0]].copy()
+            if not self.readonly:
+                bucket["stamp"][slot[0]] = self._tick()
+        # Moves are stored for the canonical board, map them back.
+        return (_FWD[sym].index(int(e["move"])), float(e["score"]), int(e["count"]))
+
+    def store(self, board: int, move: int, score: float) -> None:
+        """
+        Records a search result, evicting the bucket's least recently used entry if full.
+        """
+        if self.readonly or move > 3:
+            return
+        key, sym = canonical(board)
+        bucket: np.ndarray[Any, Any] = self._bucket(key)
+        with self._lock:
+            slot: np.ndarray[Any, Any] = np.flatnonzero(bucket["key"] == key)
+            i: int = int(slot[0]) if slot.size else int(np.argmin(bucket["stamp"]))
+            n: int = int(bucket["count"][i]) if slot.size else 0
+            prev: float = float(bucket["score"][i]) if slot.size else 0.0
+            bucket["key"][i] = key
+            bucket["move"][i] = _FWD[sym][move]
+            bucket["score"][i] = (prev * n + score) / (n + 1)
+            bucket["count"][i] = n + 1
+            bucket["stamp"][i] = self._tick()
+
+    def flush(self) -> None:
+        if not self.readonly:
+            self._entries.flush()
+            self._header.flush()
@@ -0,0 +1,219 @@
+import cv2 as cv
+import mss
+import numpy as np
+from cv2.typing import Rect
+from mss.base import MSSBase
+from threading import Thread, Event, Condition
+from time import perf_counter, sleep
+from typing import Any, Dict, List, NamedTuple, Tuple
+from .types import Image
+from .acv import screen_cap
+from .sim import Game
+from . import synth
+
+NO_REGION: Rect = (-1, -1, -1, -1)
+
+
+class Source:
+    """
+    Where frames come from. grab() returns a BGRA frame of the region, or of
+    the whole screen for NO_REGION. The returned image is only read until the
+    next grab(), so sources may hand out views of their own buffers.
+    """
+
+    def grab(self, rect: Rect) -> Image:
+        raise NotImplementedError
+
+
+class MssSource(Source):
+    """
+    Captures the display with mss.
+    """
+
+    def __init__(self) -> None:
+        # mss handles are bound to the thread that made them, so this is
+        # created on the capture thread.
+        self.sct: MSSBase | None = None
+
+    def grab(self, rect: Rect) -> Image:
+        if self.sct is None:
+            self.sct = mss.mss()
+        return screen_cap(self.sct, rect)
+
+
+def _crop(frame: Image, rect: Rect) -> Image:
+    if all([v == -1 for v in rect]):
+        return frame
+    x, y, w, h = rect
+    return frame[max(y, 0) : y + h, max(x, 0) : x + w]
+
+
+class FileSource(Source):
+    """
+    Plays back still images as if they were the screen, one per grab or at a
+    fixed rate. Loops forever.
+    """
+
+    def __init__(self, paths: List[str], fps: float = 0.0) -> None:
+        self.frames: List[Image] = [
+            cv.cvtColor(cv.imread(p, cv.IMREAD_COLOR), cv.COLOR_BGR2BGRA) for p in paths
+        ]
+        if not self.frames:
+            raise ValueError("FileSource needs at least one image.")
+        self.fps: float = fps
+        self._st: float = perf_counter()
+        self._i: int = 0
+
+    def grab(self, rect: Rect) -> Image:
+        if self.fps > 0:
+            self._i = int((perf_counter() - self._st) * self.fps)
+        else:
+            self._i += 1
+        return _crop(self.frames[self._i % len(self.frames)], rect)
+
+
+class SyntheticSource(Source):
+    """
+    Shows headless Games rendered by synth, side by side. Step a game to change
+    the screen.
+    """
+
+    def __init__(
+        self,
+        game: Game | List[Game],
+        theme: synth.Theme = synth.THEMES["classic"],
+        font: int = cv.FONT_HERSHEY_SIMPLEX,
+        screen: Tuple[int, int] = (1920, 1080),
+        size: int = 400,
+    ) -> None:
+        self.games: List[Game] = game if isinstance(game, list) else [game]
+        self.theme: synth.Theme = theme
+        self.font: int = font
+        self.screen: Tuple[int, int] = screen
+        w, h = screen
+        col: int = w // len(self.games)
+        side: int = min(size, col * 9 // 10, h * 9 // 10)
+        self.rects: List[Rect] = [
+            (i * col + (col - side) // 2, (h - side) // 2, side, side)
+            for i in range(len(self.games))
+        ]
+        self._boards: List[int] = [-1] * len(self.games)
+        self._frame: Image = np.empty((h, w, 4), dtype=np.uint8)
+        self._frame[:, :] = (*theme.page[::-1], 255)
+
+    def grab(self, rect: Rect) -> Image:
+        # Only boards that changed are drawn again.
+        for i, (g, (x, y, side, _)) in enumerate(zip(self.games, self.rects)):
+            if g.board != self._boards[i]:
+                self._boards[i] = g.board
+                self._frame, _ = synth.render(
+                    g.tiles(),
+                    self.screen,
+                    (x, y),
+                    side,
+                    self.theme,
+                    self.font,
+                    self._frame,
+                )
+        return _crop(self._frame, rect)
+
+
+class Frame(NamedTuple):
+    img: Image  # View of a ring slot, valid until the next Capture.latest().
+    rect: Rect
+    ts: float  # perf_counter() when the grab started.
+    seq: int
+
+
+class Capture:
+    """
+    Grabs frames from a source on a background thread into a ring of reusable
+    buffers. With three slots the producer always has a free one: neither the
+    newest frame nor the one the consumer holds is ever written to.
+    """
+
+    def __init__(self, source: Source, slots: int = 3, interval: float = 0.0) -> None:
+        if slots < 3:
+            raise ValueError("Capture needs at least 3 slots.")
+        self.source: Source = source
+        self.interval: float = interval  # Minimum seconds between grabs.
+        self.grabs: int = 0
+        self.grab_time: float = 0.0
+        self._slots: List[Image] = [np.empty(0, dtype=np.uint8) for _ in range(slots)]
+        self._meta: List[Tuple[Rect, float, int]] = [(NO_REGION, 0.0, 0)] * slots
+        self._latest: int = -1
+        self._held: int = -1
+        self._region: Rect = NO_REGION
+        self._region_ts: float = 0.0
+        self._cond: Condition = Condition()
+        self._stop: Event = Event()
+        self._thread: Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def set_region(self, rect: Rect) -> None:
+        """
+        Changes the captured region. Frames of the old region are not returned anymore.
+        """
+        with self._cond:
+            self._region = rect
+            self._region_ts = perf_counter()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            with self._cond:
+                rect: Rect = self._region
+                busy: Tuple[int, int] = (self._latest, self._held)
+                i: int = next(s for s in range(len(self._slots)) if s not in busy)
+            ts: float = perf_counter()
+            img: Image = self.source.grab(rect)
+            if self._slots[i].shape != img.shape:
+                self._slots[i] = np.empty(img.shape, dtype=img.dtype)
+            np.copyto(self._slots[i], img)
+            with self._cond:
+                self.grabs += 1
+                self.grab_time += perf_counter() - ts
+                self._meta[i] = (rect, ts, self.grabs)
+                self._latest = i
+                self._cond.notify_all()
+            if self.interval > 0:
+                sleep(max(0.0, self.interval - (perf_counter() - ts)))
+
+    def latest(self, after: float = 0.0, timeout: float | None = 1.0) -> Frame | None:
+        """
+        Returns the newest frame grabbed after `after` without copying it, waiting
+        only if there is none yet. The previously returned frame is released.
+        """
+
+        def ready() -> bool:
+            if self._latest == -1:
+                return False
+            _, ts, _ = self._meta[self._latest]
+            return ts >= after and ts >= self._region_ts
+
+        with self._cond:
+            self._held = -1
+            if not self._cond.wait_for(ready, timeout):
+                return None
+            self._held = self._latest
+            rect, ts, seq = self._meta[self._held]
+            return Frame(self._slots[self._held], rect, ts, seq)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "grabs": self.grabs,
+                "grab_ms": self.grab_time / max(self.grabs, 1) * 1000,
+            }
@@ -0,0 +1,343 @@
+import math
+import numpy as np
+from typing import Any, Iterable, Tuple
+
+# Mirrors the packed State in eval.hpp: 4 bits per cell holding log2 of the tile,
+# cell i at bits [4i, 4i + 4), rows of 4 cells per 16-bit word.
+GRID_SIDE_LENGTH: int = 4
+GRID_CLL_COUNT: int = 16
+LUT_ENTRIES: int = 1 << 16
+# Boards that don't fit it (other sides, tiles past 32768) are wide: 5 bits per
+# cell, as Grid in grid.hpp. They're handled as (..., side, side) arrays of ranks.
+WIDE_BITS: int = 5
+MAX_RANK: int = (1 << WIDE_BITS) - 1
+
+_M16: np.uint64 = np.uint64(0xFFFF)
+_SHIFTS: np.ndarray[Any, Any] = np.arange(0, 64, 4, dtype=np.uint64)
+
+
+def _row_cells() -> np.ndarray[Any, Any]:
+    rows: np.ndarray[Any, Any] = np.arange(LUT_ENTRIES, dtype=np.uint32)
+    return np.stack([(rows >> (4 * i)) & 0xF for i in range(4)], axis=1).astype(np.int64)
+
+
+def _slide(cells: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    # Stable sort on emptiness moves every non-empty cell left, preserving order.
+    order: np.ndarray[Any, Any] = np.argsort(cells == 0, axis=1, kind="stable")
+    return np.take_along_axis(cells, order, axis=1)
+
+
+def _mv_rows(cells: np.ndarray[Any, Any]) -> Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]:
+    """
+    Left move of rows of ranks of any length: slide, merge, slide. Returns the
+    rows and their merge scores. Merges stop at MAX_RANK.
+    """
+    cells = _slide(cells)
+    score: np.ndarray[Any, Any] = np.zeros(cells.shape[0], dtype=np.uint64)
+    for i in range(1, cells.shape[1]):
+        mrg: np.ndarray[Any, Any] = (
+            (cells[:, i - 1] == cells[:, i]) & (cells[:, i] != 0) & (cells[:, i] < MAX_RANK)
+        )
+        cells[mrg, i - 1] += 1
+        score[mrg] += (1 << cells[mrg, i - 1]).astype(np.uint64)
+        cells[mrg, i] = 0
+    return (_slide(cells), score)
+
+
+def _init_lut() -> Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]:
+    """
+    Builds the left-move row table, same as initLut(): slide, merge, slide.
+    """
+    cells, score = _mv_rows(_row_cells())
+    cells &= 0xF
+    out: np.ndarray[Any, Any] = (
+        cells[:, 0] | (cells[:, 1] << 4) | (cells[:, 2] << 8) | (cells[:, 3] << 12)
+    ).astype(np.uint64)
+    return (out, score.astype(np.uint32))
+
+
+def _row_heuristic(ln: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    """
+    Row heuristic of rows of ranks of any length, same weights as eval.cpp.
+    """
+    LOST_PENALTY: float = 200_000.0
+    W_EMPTY: float = 270.0
+    W_MERGE: float = 700.0
+    W_MONO: float = 47.0
+    W_SUM: float = 11.0
+    MONO_POW: float = 4.0
+    SUM_POW: float = 3.5
+    n: int = ln.shape[0]
+    lnf: np.ndarray[Any, Any] = ln.astype(np.float32)
+    sm: np.ndarray[Any, Any] = np.sum(lnf**SUM_POW, axis=1)
+    empties: np.ndarray[Any, Any] = np.sum(ln == 0, axis=1).astype(np.float32)
+    merges: np.ndarray[Any, Any] = np.zeros(n, dtype=np.float32)
+    prev: np.ndarray[Any, Any] = np.zeros(n, dtype=np.int64)
+    counter: np.ndarray[Any, Any] = np.zeros(n, dtype=np.float32)
+    for i in range(ln.shape[1]):
+        rank: np.ndarray[Any, Any] = ln[:, i]
+        filled: np.ndarray[Any, Any] = rank != 0
+        same: np.ndarray[Any, Any] = filled & (prev == rank)
+        flush: np.ndarray[Any, Any] = filled & ~same & (counter > 0)
+        merges += np.where(flush, 1 + counter, 0.0)
+        counter = np.where(same, counter + 1, np.where(flush, 0.0, counter))
+        prev = np.where(filled, rank, prev)
+    merges += np.where(counter > 0, 1 + counter, 0.0)
+    pw: np.ndarray[Any, Any] = lnf**MONO_POW
+    dec: np.ndarray[Any, Any] = ln[:, :-1] > ln[:, 1:]
+    mono_l: np.ndarray[Any, Any] = np.sum(np.where(dec, pw[:, :-1] - pw[:, 1:], 0.0), axis=1)
+    mono_r: np.ndarray[Any, Any] = np.sum(np.where(dec, 0.0, pw[:, 1:] - pw[:, :-1]), axis=1)
+    return (
+        LOST_PENALTY
+        + empties * W_EMPTY
+        + merges * W_MERGE
+        - np.minimum(mono_l, mono_r) * W_MONO
+        - sm * W_SUM
+    ).astype(np.float32)
+
+
+def _init_hlut() -> np.ndarray[Any, Any]:
+    """
+    Row heuristic of every 4-cell row, same as the table of combine() in eval.cpp.
+    """
+    return _row_heuristic(_row_cells())
+
+
+LUT_OUT, LUT_SCORE = _init_lut()
+HLUT: np.ndarray[Any, Any] = _init_hlut()
+
+
+def pack(tiles: Iterable[int]) -> int:
+    """
+    Packs 16 tile values (0 for empty) into a 64-bit board.
+    """
+    out: int = 0
+    for i, t in enumerate(tiles):
+        out |= (int(t).bit_length() - 1 if t > 0 else 0) << (i * 4)
+    return out
+
+
+def unpack(board: int) -> Tuple[int, ...]:
+    """
+    Expands a 64-bit board back into 16 tile values.
+    """
+    ranks: Tuple[int, ...] = tuple((board >> (i * 4)) & 0xF for i in range(GRID_CLL_COUNT))
+    return tuple(1 << r if r != 0 else 0 for r in ranks)
+
+
+def reverse(b: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    m8: np.uint64 = np.uint64(0x00FF_00FF_00FF_00FF)
+    m4: np.uint64 = np.uint64(0x0F0F_0F0F_0F0F_0F0F)
+    d8: np.ndarray[Any, Any] = (b ^ (b >> np.uint64(8))) & m8
+    r8: np.ndarray[Any, Any] = (b ^ d8) ^ (d8 << np.uint64(8))
+    d4: np.ndarray[Any, Any] = (r8 ^ (r8 >> np.uint64(4))) & m4
+    return (r8 ^ d4) ^ (d4 << np.uint64(4))
+
+
+def transpose(b: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    m2x2: np.uint64 = np.uint64(0x0000_FF00_0000_FF00)
+    m16: np.uint64 = np.uint64(0x0000_0000_FFFF_0000)
+    m4: np.uint64 = np.uint64(0x00F0_00F0_00F0_00F0)
+    d: np.ndarray[Any, Any] = (b ^ (b >> np.uint64(8))) & m2x2
+    t: np.ndarray[Any, Any] = (b ^ d) ^ (d << np.uint64(8))
+    d = (t ^ (t >> np.uint64(16))) & m16
+    t = (t ^ d) ^ (d << np.uint64(16))
+    d = (t ^ (t >> np.uint64(4))) & m4
+    t = (t ^ d) ^ (d << np.uint64(4))
+    d = (t ^ (t >> np.uint64(8))) & m2x2
+    return (t ^ d) ^ (d << np.uint64(8))
+
+
+def _mv_l(b: np.ndarray[Any, Any]) -> Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]:
+    out: np.ndarray[Any, Any] = np.zeros_like(b)
+    score: np.ndarray[Any, Any] = np.zeros(b.shape, dtype=np.uint64)
+    for sh in (0, 16, 32, 48):
+        row: np.ndarray[Any, Any] = (b >> np.uint64(sh)) & _M16
+        out |= LUT_OUT[row] << np.uint64(sh)
+        score += LUT_SCORE[row]
+    return (out, score)
+
+
+def move(b: np.ndarray[Any, Any], mv: int) -> Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]:
+    """
+    Applies a move (UP = 0, DOWN = 1, LEFT = 2, RIGHT = 3) to an array of boards.
+    Returns the new boards and the merge score of each. NONE leaves boards as-is.
+    """
+    b = np.asarray(b, dtype=np.uint64)
+    match mv:
+        case 0:
+            out, sc = _mv_l(transpose(b))
+            return (transpose(out), sc)
+        case 1:
+            out, sc = _mv_l(reverse(transpose(b)))
+            return (transpose(reverse(out)), sc)
+        case 2:
+            return _mv_l(b)
+        case 3:
+            out, sc = _mv_l(reverse(b))
+            return (reverse(out), sc)
+    return (b.copy(), np.zeros(b.shape, dtype=np.uint64))
+
+
+def cells(b: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    """
+    Expands boards into an (..., 16) array of tile ranks.
+    """
+    return (np.asarray(b, dtype=np.uint64)[..., np.newaxis] >> _SHIFTS) & np.uint64(0xF)
+
+
+def ended(b: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    b = np.asarray(b, dtype=np.uint64)
+    return np.all([move(b, m)[0] == b for m in range(4)], axis=0)
+
+
+def heuristic(b: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    t: np.ndarray[Any, Any] = transpose(b)
+    h: np.ndarray[Any, Any] = np.zeros(np.shape(b), dtype=np.float32)
+    for sh in (0, 16, 32, 48):
+        h += HLUT[(b >> np.uint64(sh)) & _M16] + HLUT[(t >> np.uint64(sh)) & _M16]
+    return h
+
+
+def _best_reply(b: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    # Max node over leaves, 0 when no move is legal (matches maxNode in eval.cpp).
+    best: np.ndarray[Any, Any] = np.zeros(b.shape, dtype=np.float32)
+    for m in range(4):
+        nb, _ = move(b, m)
+        best = np.maximum(best, np.where(nb != b, heuristic(nb), 0.0))
+    return best
+
+
+def evaluate(board: int) -> Tuple[int, np.ndarray[Any, Any]]:
+    """
+    Portable fallback for the native evaluator. Runs a 2-ply expectimax
+    (move, every spawn, move) over the whole tree at once with vectorized
+    moves and the row heuristic table. Returns the move and per-move scores.
+    """
+    root: np.ndarray[Any, Any] = np.full(4, board, dtype=np.uint64)
+    children: np.ndarray[Any, Any] = np.array([move(root[m], m)[0] for m in range(4)], dtype=np.uint64)
+    legal: np.ndarray[Any, Any] = children != root
+    scores: np.ndarray[Any, Any] = np.zeros(4, dtype=np.float32)
+    if not np.any(legal):
+        return (4, scores)
+    emp: np.ndarray[Any, Any] = cells(children) == 0
+    emp[~legal] = False
+    parent, cell = np.nonzero(emp)
+    cnt: np.ndarray[Any, Any] = np.maximum(np.sum(emp, axis=1), 1).astype(np.float32)
+    sh: np.ndarray[Any, Any] = cell.astype(np.uint64) * np.uint64(4)
+    spawn2: np.ndarray[Any, Any] = children[parent] | (np.uint64(1) << sh)
+    spawn4: np.ndarray[Any, Any] = children[parent] | (np.uint64(2) << sh)
+    v: np.ndarray[Any, Any] = 0.9 * _best_reply(spawn2) + 0.1 * _best_reply(spawn4)
+    scores = (np.bincount(parent, weights=v, minlength=4) / cnt).astype(np.float32)
+    scores[~legal] = 0.0
+    return (int(np.argmax(np.where(legal, scores, -1.0))), scores)
+
+
+def fits(tiles: Tuple[int, ...]) -> bool:
+    """
+    Whether a board of tile values fits the packed 64-bit board: 4x4, tiles up to 32768.
+    """
+    return len(tiles) == GRID_CLL_COUNT and max(tiles) <= 1 << 15
+
+
+def side(tiles: Tuple[int, ...]) -> int:
+    return math.isqrt(len(tiles))
+
+
+def pack_wide(tiles: Iterable[int]) -> int:
+    """
+    Packs tile values of a board of any size into an int, WIDE_BITS per cell.
+    """
+    out: int = 0
+    for i, t in enumerate(tiles):
+        out |= (int(t).bit_length() - 1 if t > 0 else 0) << (i * WIDE_BITS)
+    return out
+
+
+def unpack_wide(board: int, count: int) -> Tuple[int, ...]:
+    ranks: Tuple[int, ...] = tuple((board >> (i * WIDE_BITS)) & MAX_RANK for i in range(count))
+    return tuple(1 << r if r != 0 else 0 for r in ranks)
+
+
+def ranks(tiles: Tuple[int, ...]) -> np.ndarray[Any, Any]:
+    """
+    A board of tile values as a (side, side) array of ranks.
+    """
+    n: int = side(tiles)
+    return np.array(
+        [int(t).bit_length() - 1 if t > 0 else 0 for t in tiles], dtype=np.int64
+    ).reshape(n, n)
+
+
+def tiles(g: np.ndarray[Any, Any]) -> Tuple[int, ...]:
+    return tuple(1 << int(r) if r != 0 else 0 for r in g.flatten())
+
+
+def _grid_l(g: np.ndarray[Any, Any]) -> Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]:
+    n: int = g.shape[-1]
+    out, sc = _mv_rows(g.reshape(-1, n).copy())
+    return (out.reshape(g.shape), sc.reshape(g.shape[:-1]).sum(axis=-1))
+
+
+def grid_move(
+    g: np.ndarray[Any, Any], mv: int
+) -> Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]:
+    """
+    move() for wide boards, arrays of ranks shaped (..., side, side).
+    """
+    g = np.asarray(g, dtype=np.int64)
+    match mv:
+        case 0:
+            out, sc = _grid_l(g.swapaxes(-1, -2))
+            return (out.swapaxes(-1, -2), sc)
+        case 1:
+            out, sc = _grid_l(g.swapaxes(-1, -2)[..., ::-1])
+            return (out[..., ::-1].swapaxes(-1, -2), sc)
+        case 2:
+            return _grid_l(g)
+        case 3:
+            out, sc = _grid_l(g[..., ::-1])
+            return (out[..., ::-1], sc)
+    return (g.copy(), np.zeros(g.shape[:-2], dtype=np.uint64))
+
+
+def grid_heuristic(g: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    n: int = g.shape[-1]
+    rows: np.ndarray[Any, Any] = _row_heuristic(g.reshape(-1, n))
+    cols: np.ndarray[Any, Any] = _row_heuristic(g.swapaxes(-1, -2).reshape(-1, n))
+    return (rows + cols).reshape(g.shape[:-1]).sum(axis=-1)
+
+
+def _grid_best_reply(g: np.ndarray[Any, Any]) -> np.ndarray[Any, Any]:
+    best: np.ndarray[Any, Any] = np.zeros(g.shape[:-2], dtype=np.float32)
+    for m in range(4):
+        ng, _ = grid_move(g, m)
+        moved: np.ndarray[Any, Any] = np.any(ng != g, axis=(-1, -2))
+        best = np.maximum(best, np.where(moved, grid_heuristic(ng), 0.0))
+    return best
+
+
+def evaluate_grid(g: np.ndarray[Any, Any]) -> Tuple[int, np.ndarray[Any, Any]]:
+    """
+    evaluate() for a wide board, a (side, side) array of ranks.
+    """
+    n: int = g.shape[-1]
+    children: np.ndarray[Any, Any] = np.stack([grid_move(g, m)[0] for m in range(4)])
+    legal: np.ndarray[Any, Any] = np.any(children != g, axis=(-1, -2))
+    scores: np.ndarray[Any, Any] = np.zeros(4, dtype=np.float32)
+    if not np.any(legal):
+        return (4, scores)
+    emp: np.ndarray[Any, Any] = children.reshape(4, n * n) == 0
+    emp[~legal] = False
+    parent, cell = np.nonzero(emp)
+    cnt: np.ndarray[Any, Any] = np.maximum(np.sum(emp, axis=1), 1).astype(np.float32)
+    spawn2: np.ndarray[Any, Any] = children[parent].reshape(-1, n * n)
+    spawn4: np.ndarray[Any, Any] = spawn2.copy()
+    spawn2[np.arange(cell.size), cell] = 1
+    spawn4[np.arange(cell.size), cell] = 2
+    v: np.ndarray[Any, Any] = 0.9 * _grid_best_reply(
+        spawn2.reshape(-1, n, n)
+    ) + 0.1 * _grid_best_reply(spawn4.reshape(-1, n, n))
+    scores = (np.bincount(parent, weights=v, minlength=4) / cnt).astype(np.float32)
+    scores[~legal] = 0.0
+    return (int(np.argmax(np.where(legal, scores, -1.0))), scores)
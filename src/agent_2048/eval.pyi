@@ -1,7 +1,9 @@
 from __future__ import annotations
 import collections.abc
+import numpy
+import numpy.typing
 import typing
-__all__: list[str] = ['Evaluation', 'Move', 'evaluate']
+__all__: list[str] = ['Evaluation', 'Move', 'Result', 'Weights', 'evaluate', 'evaluate_batch', 'evaluate_grid', 'evaluate_timed', 'get_rollout_depth', 'get_weights', 'get_workers', 'set_rollout_depth', 'set_weights', 'set_workers']
 class Evaluation:
     """
     Members:
@@ -91,5 +93,55 @@ class Move:
     @property
     def value(self) -> int:
         ...
+class Result:
+    @property
+    def confidence(self) -> typing.Annotated[list[float], "FixedSize(4)"]:
+        ...
+    @property
+    def counts(self) -> typing.Annotated[list[int], "FixedSize(4)"]:
+        ...
+    @property
+    def depth(self) -> int:
+        ...
+    @property
+    def elapsed(self) -> float:
+        ...
+    @property
+    def iterations(self) -> int:
+        ...
+    @property
+    def move(self) -> Move:
+        ...
+    @property
+    def scores(self) -> typing.Annotated[list[float], "FixedSize(4)"]:
+        ...
+class Weights:
+    corner: float
+    empty: float
+    lost: float
+    merge: float
+    mono: float
+    smooth: float
+    sum: float
+    def __init__(self) -> None:
+        ...
 def evaluate(arg0: typing.Annotated[collections.abc.Sequence[typing.SupportsInt], "FixedSize(16)"], arg1: typing.SupportsInt) -> Move:
     ...
+def evaluate_batch(states: numpy.typing.NDArray[numpy.uint64], type: typing.SupportsInt, moves: numpy.typing.NDArray[numpy.uint8], scores: numpy.typing.NDArray[numpy.float32]) -> None:
+    ...
+def evaluate_grid(arg0: collections.abc.Sequence[typing.SupportsInt], arg1: typing.SupportsInt, arg2: typing.SupportsFloat) -> Result:
+    ...
+def evaluate_timed(arg0: typing.Annotated[collections.abc.Sequence[typing.SupportsInt], "FixedSize(16)"], arg1: typing.SupportsInt, arg2: typing.SupportsFloat) -> Result:
+    ...
+def get_rollout_depth() -> int:
+    ...
+def get_weights() -> Weights:
+    ...
+def get_workers() -> int:
+    ...
+def set_rollout_depth(arg0: typing.SupportsInt) -> None:
+    ...
+def set_weights(arg0: Weights) -> None:
+    ...
+def set_workers(arg0: typing.SupportsInt) -> None:
+    ...
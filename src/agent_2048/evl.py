@@ -1,70 +1,159 @@
-from typing import Tuple, List
+import numpy as np
+from threading import Thread, Event
+from typing import Tuple, List, Dict, Any
 from random import choice
-from copy import copy
-from .eval import evaluate, Move, Evaluation
-
-GRID_SIDE_LENGTH: int = 4
-GRID_CLL_COUNT: int = 16
-
-def _transpose(state: List[int], mv: Move) -> List[int]:
-    nstate: List[int] = [0 for _ in state]
-    if mv == Move.UP or mv == Move.DOWN:
-        for y in range(GRID_SIDE_LENGTH):
-            for x in range(GRID_SIDE_LENGTH):
-                nstate[x * GRID_SIDE_LENGTH + y] = state[y * GRID_SIDE_LENGTH + x]
-        return nstate
-    return copy(state)
-
-def _reverse(state: List[int], mv: Move) -> List[int]:
-    nstate: List[int] = [0 for _ in state]
-    if mv == Move.DOWN or mv == Move.RIGHT:
-        for y in range(0, GRID_CLL_COUNT, GRID_SIDE_LENGTH):
-            for x in range(GRID_SIDE_LENGTH):
-                nstate[y + x] = state[y + (GRID_SIDE_LENGTH - x - 1)]
-        return nstate
-    return copy(state)
-
-def _slide(state: List[int]) -> List[int]:
-    sstate: List[int] = []
-    for i in range(GRID_SIDE_LENGTH):
-        offset: int =  i * GRID_SIDE_LENGTH
-        nonzero: List[int] = [n for n in state[offset: offset + GRID_SIDE_LENGTH] if n != 0]
-        slstate: List[int] = [0 for _ in range(GRID_SIDE_LENGTH)]
-        slstate[0:len(nonzero)] = nonzero
-        sstate.extend(slstate)
-    return sstate
-
-def _merge(state: List[int]) -> List[int]:
-    nstate: List[int] = copy(state)
-    for i in range(0, GRID_CLL_COUNT, 4):
-        for j in range(1, GRID_SIDE_LENGTH):
-            cIdx: int = i + j - 1
-            fIdx: int = i + j
-            if nstate[fIdx] == nstate[cIdx] and nstate[fIdx] != 0:
-                nstate[cIdx] *= 2
-                nstate[fIdx] = 0
-    return nstate
+from . import eng
+from .book import Book
+
+# The compiled evaluator is only shipped for Windows. Everywhere else the
+# NumPy engine in eng.py stands in for it.
+try:
+    from .eval import (
+        evaluate_timed,
+        evaluate_grid,
+        evaluate_batch,
+        set_workers,
+        Move,
+        Evaluation,
+        Result,
+    )
+
+    NATIVE: bool = True
+except ImportError:
+    from .types import Move, Evaluation
+
+    NATIVE = False
+
+GRID_SIDE_LENGTH: int = eng.GRID_SIDE_LENGTH
+GRID_CLL_COUNT: int = eng.GRID_CLL_COUNT
+
 
 def get_nstate(state: Tuple[Tuple[int, float], ...], mv: Move) -> Tuple[int, ...]:
-    nstate: List[int] = _reverse(_transpose(list(s[0] for s in state), mv), mv)
-    tstate: List[int] = _slide(_merge(_slide(nstate)))
-    return tuple(_transpose(_reverse(tstate, mv), mv))
+    rst: Tuple[int, ...] = tuple(s[0] for s in state)
+    if not eng.fits(rst):
+        return eng.tiles(eng.grid_move(eng.ranks(rst), int(mv))[0])
+    board: np.uint64 = np.uint64(eng.pack(rst))
+    nboard, _ = eng.move(board, int(mv))
+    return eng.unpack(int(nboard))
+
+
+def search(
+    rst: Tuple[int, ...], budget: float, ev: Evaluation = Evaluation.AUTO
+) -> Tuple[Move, float]:
+    """
+    Searches a board of tile values for the given budget in milliseconds.
+    Returns the best move and its score. Without the native evaluator, ev
+    and budget are ignored and the NumPy fallback is used. Boards other than
+    4x4, or with tiles past 32768, are searched wide (expectimax only).
+    """
+    wide: bool = not eng.fits(rst)
+    if NATIVE:
+        res: Result = (evaluate_grid if wide else evaluate_timed)(rst, ev, budget)
+        mv: Move = Move(res.move)
+        return (mv, res.scores[mv] if mv != Move.NONE else 0.0)
+    imv, scores = eng.evaluate_grid(eng.ranks(rst)) if wide else eng.evaluate(eng.pack(rst))
+    return (Move(imv), float(scores[imv]) if imv != Move.NONE else 0.0)
+
+
+class Ponderer:
+    """
+    Searches the likely boards that follow a move while it animates on screen.
+    Every empty cell of the predicted board is tried with a 2 spawn, then a 4,
+    and the results are cached by board for get_move() to pick up.
+    """
+
+    def __init__(self, budget: float) -> None:
+        self.budget: float = budget  # ms, per searched board.
+        self.hits: int = 0
+        self.misses: int = 0
+        self._cache: Dict[Tuple[int, ...], Move] = {}
+        self._stop: Event = Event()
+
+    def start(self, predicted: Tuple[int, ...]) -> None:
+        """
+        Starts pondering on the board predicted before its spawn. Any previous
+        pondering is abandoned without waiting for it.
+        """
+        self._stop.set()
+        self._stop = Event()
+        self._cache = {}
+        if not predicted:
+            return
+        Thread(
+            target=self._ponder, args=(predicted, self._cache, self._stop), daemon=True
+        ).start()
+
+    def lookup(self, rst: Tuple[int, ...]) -> Move | None:
+        """
+        Stops pondering and returns the cached move for the board, if any.
+        """
+        self._stop.set()
+        mv: Move | None = self._cache.get(rst)
+        if mv is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return mv
+
+    def _ponder(
+        self, predicted: Tuple[int, ...], cache: Dict[Tuple[int, ...], Move], stop: Event
+    ) -> None:
+        empty: List[int] = [i for i, t in enumerate(predicted) if t == 0]
+        for tile in (2, 4):
+            for i in empty:
+                if stop.is_set():
+                    return
+                rst: Tuple[int, ...] = predicted[:i] + (tile,) + predicted[i + 1 :]
+                cache[rst] = search(rst, self.budget)[0]
 
 
 def get_move(
     state: Tuple[Tuple[int, float], ...],
+    budget: float,
+    ponderer: Ponderer | None = None,
+    book: Book | None = None,
 ) -> Tuple[bool, Move, Tuple[int, ...]]:
-    
+    """
+    Searches for the best move within the given budget in milliseconds.
+    Boards already searched by the ponderer or stored in the book are
+    answered without searching. New results are added to the book, which
+    only holds boards that fit the packed 64-bit board.
+    """
     for n, _ in state:
         if (n & (n - 1)) != 0:
             return (False, Move.NONE, ())
     rst: Tuple[int, ...] = tuple([s[0] for s in state])
-    mvs: Tuple[Move, ...] = (Move.UP, Move.DOWN, Move.LEFT, Move.RIGHT, Move.NONE)
-    states: List[Tuple[int, ...]] = [get_nstate(state, m) for m in mvs]
-    mv: Move = Move(evaluate(rst, Evaluation.MC))
-    return (True, mv, states[mvs.index(mv)])
+    mv: Move | None = ponderer.lookup(rst) if ponderer else None
+    entry: Tuple[int, float, int] | None = None
+    if not eng.fits(rst):
+        book = None
+    if mv is None and book:
+        entry = book.lookup(eng.pack(rst))
+        mv = Move(entry[0]) if entry else None
+    if mv is None:
+        mv, sc = search(rst, budget)
+        if book:
+            book.store(eng.pack(rst), int(mv), sc)
+    return (True, mv, get_nstate(state, mv))
     # if vmvs:
     #     rmv: Move = choice(vmvs)
     #     return (True, rmv, states[mvs.index(rmv)])
     # return (False, Move.NONE, ())
-    
+
+
+def evaluate_boards(
+    boards: np.ndarray[Any, Any], ev: Evaluation = Evaluation.AUTO
+) -> Tuple[np.ndarray[Any, Any], np.ndarray[Any, Any]]:
+    """
+    Evaluates an array of packed boards (4 bits per cell, log2 of the tile value)
+    in parallel. Returns the chosen moves and the (N, 4) per-move scores.
+    """
+    states: np.ndarray[Any, Any] = np.ascontiguousarray(boards, dtype=np.uint64)
+    moves: np.ndarray[Any, Any] = np.empty(states.shape[0], dtype=np.uint8)
+    scores: np.ndarray[Any, Any] = np.empty((states.shape[0], 4), dtype=np.float32)
+    if NATIVE:
+        evaluate_batch(states, ev, moves, scores)
+        return (moves, scores)
+    for i, b in enumerate(states):
+        moves[i], scores[i] = eng.evaluate(int(b))
+    return (moves, scores)
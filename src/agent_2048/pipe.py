@@ -0,0 +1,127 @@
+import logging
+from queue import Queue, Empty, Full
+from threading import Thread, Event, Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+
+type StageFunc = Callable[[Any], Any]
+
+
+class StageStats:
+    def __init__(self) -> None:
+        self.processed: int = 0
+        self.filtered: int = 0  # Items the stage itself dropped by returning None.
+        self.dropped: int = 0  # Inputs replaced by a newer one before the stage got to them.
+        self.busy: float = 0.0
+
+
+class Pipeline:
+    """
+    Runs each stage on its own thread. Stages are connected by bounded queues.
+    When a queue is full the oldest item in it is dropped, so every stage
+    always works on the freshest input. The first stage pulls its inputs from
+    `source`. A stage returning None drops the item.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], Any],
+        stages: List[Tuple[str, StageFunc]],
+        depth: int = 1,
+    ) -> None:
+        self.source: Callable[[], Any] = source
+        self.stages: List[Tuple[str, StageFunc]] = stages
+        self.queues: List[Queue[Any]] = [Queue(depth) for _ in stages[1:]]
+        self._stats: List[StageStats] = [StageStats() for _ in stages]
+        self.error: BaseException | None = None
+        self._lock: Lock = Lock()
+        self._stop: Event = Event()
+        self._threads: List[Thread] = []
+        self._st: float = 0.0
+
+    def _put(self, k: int, item: Any) -> None:
+        q: Queue[Any] = self.queues[k]
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except Full:
+                try:
+                    q.get_nowait()
+                    with self._lock:
+                        self._stats[k + 1].dropped += 1
+                except Empty:
+                    pass
+
+    def _get(self, k: int) -> Any:
+        while not self._stop.is_set():
+            try:
+                return self.queues[k - 1].get(timeout=0.1)
+            except Empty:
+                continue
+        return None
+
+    def _run(self, k: int) -> None:
+        _, func = self.stages[k]
+        stats: StageStats = self._stats[k]
+        try:
+            while not self._stop.is_set():
+                item: Any = self.source() if k == 0 else self._get(k)
+                if item is None:
+                    continue
+                st: float = perf_counter()
+                out: Any = func(item)
+                with self._lock:
+                    stats.busy += perf_counter() - st
+                    stats.processed += 1
+                    stats.filtered += out is None
+                if out is not None and k < len(self.queues):
+                    self._put(k, out)
+        except BaseException as e:
+            logging.exception(f"Stage {self.stages[k][0]} failed.")
+            self.error = e
+            self._stop.set()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._st = perf_counter()
+        self._threads = [
+            Thread(target=self._run, args=(k,), name=name, daemon=True)
+            for k, (name, _) in enumerate(self.stages)
+        ]
+        for t in self._threads:
+            t.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join()
+
+    def join(self) -> None:
+        """
+        Blocks until the pipeline stops. Re-raises the error that stopped it, if any.
+        """
+        while not self._stop.wait(0.5):
+            pass
+        self.stop()
+        if self.error is not None:
+            raise self.error
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per-stage throughput, utilization and queue depth.
+        """
+        elapsed: float = max(perf_counter() - self._st, 1e-9)
+        with self._lock:
+            return {
+                name: {
+                    "queue": float(self.queues[k - 1].qsize()) if k > 0 else 0.0,
+                    "processed": float(s.processed),
+                    "filtered": float(s.filtered),
+                    "dropped": float(s.dropped),
+                    "per_s": s.processed / elapsed,
+                    "busy": s.busy / elapsed,
+                    "ms": s.busy / max(s.processed, 1) * 1000,
+                }
+                for k, ((name, _), s) in enumerate(zip(self.stages, self._stats))
+            }
@@ -0,0 +1,253 @@
+import argparse
+import json
+import mmap
+import sys
+import cv2 as cv
+import numpy as np
+from cv2.typing import Rect
+from queue import Queue, Full
+from threading import Thread
+from time import perf_counter, sleep
+from typing import Any, Dict, Iterator, List, NamedTuple, Tuple
+from .types import Image
+from .acv import locate_grid, detect_cells, crop_digits, get_state, Recognizer, Tracker
+from .evl import get_move, get_nstate, Move
+
+MAGIC: bytes = b"A2048RC1"
+GRID_CLL_COUNT: int = 16
+# Fixed-size header of every chunk, followed by `size` bytes of PNG encoded frame.
+META: np.dtype[Any] = np.dtype(
+    [
+        ("t", "<f8"),  # Seconds since the recording started.
+        ("rect", "<i4", (4,)),  # Board rectangle the frame was captured with.
+        ("tiles", "<u4", (GRID_CLL_COUNT,)),
+        ("conf", "<f4", (GRID_CLL_COUNT,)),
+        ("move", "u1"),
+        ("status", "u1"),  # Stages that succeeded, see the flags below.
+        ("dropped", "<u2"),  # Frames dropped right before this one.
+        ("size", "<u4"),
+    ]
+)
+GRID_OK: int = 1
+DIGITS_OK: int = 2
+STATE_OK: int = 4
+MOVE_OK: int = 8
+
+
+class Recorder:
+    """
+    Streams frames and what the agent made of them to disk. Encoding and
+    writing run on a background thread. Frames are dropped rather than
+    stalling the caller when the queue is full.
+    """
+
+    def __init__(self, path: str, level: int = 1, queue_size: int = 64) -> None:
+        self.level: int = level  # PNG compression level, 0-9.
+        self.dropped: int = 0
+        self._gap: int = 0
+        self._st: float = perf_counter()
+        self._queue: Queue[Tuple[np.ndarray[Any, Any], Image] | None] = Queue(queue_size)
+        self._file = open(path, "wb")
+        self._file.write(MAGIC)
+        self._thread: Thread = Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def write(
+        self,
+        frame: Image,
+        rect: Rect,
+        state: Tuple[Tuple[int, float], ...],
+        move: Move,
+        status: int,
+    ) -> None:
+        """
+        Queues a frame. The frame must not be modified afterwards.
+        """
+        meta: np.ndarray[Any, Any] = np.zeros(1, dtype=META)
+        meta["t"] = perf_counter() - self._st
+        meta["rect"] = rect
+        if len(state) == GRID_CLL_COUNT:
+            meta["tiles"] = [s[0] for s in state]
+            meta["conf"] = [s[1] for s in state]
+        meta["move"] = int(move)
+        meta["status"] = status
+        meta["dropped"] = min(self._gap, np.iinfo(np.uint16).max)
+        try:
+            self._queue.put_nowait((meta, frame))
+            self._gap = 0
+        except Full:
+            self.dropped += 1
+            self._gap += 1
+
+    def _drain(self) -> None:
+        while (item := self._queue.get()) is not None:
+            meta, frame = item
+            _, buf = cv.imencode(".png", frame, (cv.IMWRITE_PNG_COMPRESSION, self.level))
+            meta["size"] = buf.size
+            self._file.write(meta.tobytes())
+            self._file.write(buf.tobytes())
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+
+class Entry(NamedTuple):
+    meta: np.ndarray[Any, Any]
+    frame: Image
+
+
+class Recording:
+    """
+    Memory-mapped recording. Chunk headers are indexed on open. Frames are
+    decoded straight from the mapped file when accessed.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._mm: mmap.mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a recording.")
+        self._offsets: List[int] = []
+        off: int = len(MAGIC)
+        # A recording cut short by a crash simply ends at its last complete chunk.
+        while off + META.itemsize <= len(self._mm):
+            size: int = int(np.frombuffer(self._mm, META, 1, off)["size"][0])
+            if off + META.itemsize + size > len(self._mm):
+                break
+            self._offsets.append(off)
+            off += META.itemsize + size
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, i: int) -> Entry:
+        off: int = self._offsets[i]
+        meta: np.ndarray[Any, Any] = np.frombuffer(self._mm, META, 1, off)[0]
+        buf: np.ndarray[Any, Any] = np.frombuffer(
+            self._mm, np.uint8, int(meta["size"]), off + META.itemsize
+        )
+        return Entry(meta, cv.imdecode(buf, cv.IMREAD_UNCHANGED))
+
+    def __iter__(self) -> Iterator[Entry]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def replay(path: str, realtime: bool = False, budget: float = 40.0) -> Dict[str, Any]:
+    """
+    Feeds a recording through the same stages as Agent.run, as fast as possible
+    or at the recorded pace. Reports per-stage timings, the frames that failed
+    and the frames whose state differs from the recording.
+    """
+    STAGES: Tuple[str, ...] = (
+        "decode",
+        "track",
+        "detect_grid",
+        "detect_digits",
+        "get_state",
+        "get_move",
+    )
+    rcd: Recording = Recording(path)
+    rcg: Recognizer = Recognizer()
+    trk: Tracker = Tracker()
+    lat: Dict[str, List[float]] = {s: [] for s in STAGES}
+    failures: Dict[str, List[int]] = {"grid": [], "digits": [], "state": [], "move": []}
+    mismatches: List[int] = []
+    predicted: Tuple[int, ...] = ()
+    st: float = perf_counter()
+    for i in range(len(rcd)):
+        t: float = perf_counter()
+        meta, frame = rcd[i]
+        lat["decode"].append((perf_counter() - t) * 1000)
+        if realtime:
+            sleep(max(0.0, float(meta["t"]) - (perf_counter() - st)))
+        t = perf_counter()
+        sts0, grid, digits = trk.track(frame)
+        lat["track"].append((perf_counter() - t) * 1000)
+        if not sts0:
+            t = perf_counter()
+            sts1, grid, loc = locate_grid(frame)
+            lat["detect_grid"].append((perf_counter() - t) * 1000)
+            if not sts1:
+                trk.reset()
+                failures["grid"].append(i)
+                continue
+            t = perf_counter()
+            sts2, cells = detect_cells(grid)
+            if sts2:
+                trk.acquire(frame, loc, cells)
+                digits = crop_digits(grid, cells)
+            lat["detect_digits"].append((perf_counter() - t) * 1000)
+            if not sts2:
+                failures["digits"].append(i)
+                continue
+        # Same template feedback as Agent._update_templates, as long as the previous
+        # frame is the one the prediction was made on.
+        if meta["dropped"]:
+            predicted = ()
+        for d, tile in zip(digits, predicted):
+            if tile != 0 and tile & (tile - 1) == 0:
+                rcg.add_template(d, tile)
+        t = perf_counter()
+        try:
+            sts3, state = get_state(digits, rcg)
+        except ValueError:
+            sts3, state = (False, ())
+        lat["get_state"].append((perf_counter() - t) * 1000)
+        if not sts3:
+            failures["state"].append(i)
+            continue
+        if meta["status"] & STATE_OK and tuple(meta["tiles"]) != tuple(s[0] for s in state):
+            mismatches.append(i)
+        t = perf_counter()
+        sts4, _, predicted = get_move(state, budget)
+        lat["get_move"].append((perf_counter() - t) * 1000)
+        if not sts4:
+            failures["move"].append(i)
+        # The next frame shows the move that was played, not the one searched here.
+        if meta["status"] & MOVE_OK:
+            predicted = get_nstate(state, Move(int(meta["move"])))
+    return {
+        "frames": len(rcd),
+        "wall_s": perf_counter() - st,
+        "track_hit_rate": trk.hits / max(trk.hits + trk.misses, 1),
+        "cell_hit_rate": rcg.cell_hit_rate(),
+        "value_hit_rate": rcg.value_hit_rate(),
+        "latency_ms": {
+            s: {
+                "p50": float(np.percentile(v, 50)),
+                "p90": float(np.percentile(v, 90)),
+                "p99": float(np.percentile(v, 99)),
+                "mean": float(np.mean(v)),
+            }
+            for s, v in lat.items()
+            if v
+        },
+        "failures": failures,
+        "mismatches": mismatches,
+    }
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m agent_2048.rec",
+        description="Replays a recording through the vision pipeline and reports JSON.",
+    )
+    parser.add_argument("path", type=str)
+    parser.add_argument("--realtime", action="store_true", help="replay at the recorded pace")
+    parser.add_argument("-b", "--budget", type=float, default=40.0, help="ms per move")
+    parser.add_argument("-o", "--out", type=str, default=None, help="output file, stdout if omitted")
+    args: argparse.Namespace = parser.parse_args()
+
+    out: str = json.dumps(replay(args.path, args.realtime, args.budget), indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        sys.stdout.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Any, Tuple
+from . import eng
+
+
+class Game:
+    """
+    Headless 2048 game on a packed board. Spawns follow the native
+    randTile: a uniformly chosen empty cell gets a 2, or a 4 one time in 10.
+    4x4 games use the 64-bit board, other sides the wide one of eng.pack_wide().
+    """
+
+    def __init__(self, seed: int | None = None, side: int = eng.GRID_SIDE_LENGTH) -> None:
+        self.side: int = side
+        self.wide: bool = side != eng.GRID_SIDE_LENGTH
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.board: int = self._spawn(self._spawn(0))
+        self.score: int = 0
+        self.moves: int = 0
+
+    def _spawn(self, board: int) -> int:
+        empty: np.ndarray[Any, Any] = np.flatnonzero(
+            eng.ranks(eng.unpack_wide(board, self.side * self.side)) == 0
+            if self.wide
+            else eng.cells(np.uint64(board)) == 0
+        )
+        if empty.size == 0:
+            return board
+        cell: int = int(self.rng.choice(empty))
+        rank: int = 2 if self.rng.random() < 0.1 else 1
+        return board | (rank << (cell * (eng.WIDE_BITS if self.wide else 4)))
+
+    def tiles(self) -> Tuple[int, ...]:
+        if self.wide:
+            return eng.unpack_wide(self.board, self.side * self.side)
+        return eng.unpack(self.board)
+
+    def max_tile(self) -> int:
+        return max(self.tiles())
+
+    def ended(self) -> bool:
+        if self.wide:
+            g: np.ndarray[Any, Any] = eng.ranks(self.tiles())
+            return all(np.array_equal(eng.grid_move(g, m)[0], g) for m in range(4))
+        return bool(eng.ended(np.uint64(self.board)))
+
+    def step(self, mv: int) -> bool:
+        """
+        Plays a move and spawns a tile. Returns False if the move changes nothing.
+        """
+        if self.wide:
+            ng, sc = eng.grid_move(eng.ranks(self.tiles()), mv)
+            nboard: int = eng.pack_wide(eng.tiles(ng))
+        else:
+            nb, sc = eng.move(np.uint64(self.board), mv)
+            nboard = int(nb)
+        if nboard == self.board:
+            return False
+        self.board = self._spawn(nboard)
+        self.score += int(sc)
+        self.moves += 1
+        return True
@@ -0,0 +1,182 @@
+import math
+import cv2 as cv
+import numpy as np
+from cv2.typing import Rect
+from typing import Any, Dict, List, NamedTuple, Tuple
+from .types import Image
+
+type Color = Tuple[int, int, int]
+
+GRID_SIDE_LENGTH: int = 4
+GRID_CLL_COUNT: int = 16
+
+
+class Theme(NamedTuple):
+    """
+    Board colors, all RGB. Tiles above the largest listed value reuse its color.
+    """
+
+    page: Color
+    board: Color
+    empty: Color
+    tiles: Dict[int, Color]
+    dark_text: Color
+    light_text: Color
+    dark_below: int  # Tiles below this value use dark_text.
+
+
+THEMES: Dict[str, Theme] = {
+    "classic": Theme(
+        page=(250, 248, 239),
+        board=(187, 173, 160),
+        empty=(205, 193, 180),
+        tiles={
+            2: (238, 228, 218),
+            4: (237, 224, 200),
+            8: (242, 177, 121),
+            16: (245, 149, 99),
+            32: (246, 124, 95),
+            64: (246, 94, 59),
+            128: (237, 207, 114),
+            256: (237, 204, 97),
+            512: (237, 200, 80),
+            1024: (237, 197, 63),
+            2048: (237, 194, 46),
+            4096: (60, 58, 50),
+        },
+        dark_text=(119, 110, 101),
+        light_text=(249, 246, 242),
+        dark_below=8,
+    ),
+    "dark": Theme(
+        page=(30, 30, 30),
+        board=(60, 60, 66),
+        empty=(80, 80, 88),
+        tiles={
+            2: (110, 120, 140),
+            4: (100, 110, 160),
+            8: (90, 130, 190),
+            16: (70, 150, 200),
+            32: (60, 170, 180),
+            64: (60, 180, 140),
+            128: (90, 190, 100),
+            256: (150, 190, 70),
+            512: (200, 180, 60),
+            1024: (220, 150, 60),
+            2048: (230, 110, 60),
+        },
+        dark_text=(240, 240, 240),
+        light_text=(250, 250, 250),
+        dark_below=0,
+    ),
+    "mono": Theme(
+        page=(255, 255, 255),
+        board=(120, 120, 120),
+        empty=(160, 160, 160),
+        tiles={2: (230, 230, 230), 16: (200, 200, 200), 256: (90, 90, 90), 4096: (30, 30, 30)},
+        dark_text=(20, 20, 20),
+        light_text=(245, 245, 245),
+        dark_below=256,
+    ),
+}
+
+FONTS: Dict[str, int] = {
+    "simplex": cv.FONT_HERSHEY_SIMPLEX,
+    "duplex": cv.FONT_HERSHEY_DUPLEX,
+    "complex": cv.FONT_HERSHEY_COMPLEX,
+    "triplex": cv.FONT_HERSHEY_TRIPLEX,
+}
+
+
+def _tile_color(theme: Theme, value: int) -> Color:
+    keys: List[int] = [k for k in sorted(theme.tiles) if k <= value]
+    return theme.tiles[keys[-1] if keys else min(theme.tiles)]
+
+
+def _rounded_rect(img: Image, x: int, y: int, w: int, h: int, r: int, color: Color) -> None:
+    r = min(r, w // 2, h // 2)
+    clr: Tuple[int, ...] = (*color[::-1], 255)
+    cv.rectangle(img, (x + r, y), (x + w - 1 - r, y + h - 1), clr, cv.FILLED)
+    cv.rectangle(img, (x, y + r), (x + w - 1, y + h - 1 - r), clr, cv.FILLED)
+    for cx in (x + r, x + w - 1 - r):
+        for cy in (y + r, y + h - 1 - r):
+            cv.circle(img, (cx, cy), r, clr, cv.FILLED, cv.LINE_AA)
+
+
+def render(
+    tiles: Tuple[int, ...],
+    screen: Tuple[int, int] = (1920, 1080),
+    pos: Tuple[int, int] = (760, 340),
+    size: int = 400,
+    theme: Theme = THEMES["classic"],
+    font: int = cv.FONT_HERSHEY_SIMPLEX,
+    frame: Image | None = None,
+) -> Tuple[Image, Rect]:
+    """
+    Renders a 2048 board of any square size onto a blank screen, or over an
+    earlier frame of the same screen. The frame is BGRA like an mss capture.
+    Returns the frame and the board's rectangle on it.
+    """
+    if frame is None:
+        w, h = screen
+        frame = np.empty((h, w, 4), dtype=np.uint8)
+        frame[:, :] = (*theme.page[::-1], 255)
+    bx, by = pos
+    side: int = math.isqrt(len(tiles))
+    gap: int = max(2, round(size * 0.03 * GRID_SIDE_LENGTH / side))
+    cell: int = (size - gap * (side + 1)) // side
+    _rounded_rect(frame, bx, by, size, size, gap, theme.board)
+    for i, v in enumerate(tiles):
+        cx: int = bx + gap + (i % side) * (cell + gap)
+        cy: int = by + gap + (i // side) * (cell + gap)
+        clr: Color = theme.empty if v == 0 else _tile_color(theme, v)
+        _rounded_rect(frame, cx, cy, cell, cell, gap, clr)
+        if v == 0:
+            continue
+        text: str = str(v)
+        (tw, th), _ = cv.getTextSize(text, font, 1.0, 1)
+        scl: float = min(cell * 0.7 / tw, cell * 0.4 / th)
+        thick: int = max(1, round(scl * 2))
+        (tw, th), _ = cv.getTextSize(text, font, scl, thick)
+        clr = theme.dark_text if v < theme.dark_below else theme.light_text
+        cv.putText(
+            frame,
+            text,
+            (cx + (cell - tw) // 2, cy + (cell + th) // 2),
+            font,
+            scl,
+            (*clr[::-1], 255),
+            thick,
+            cv.LINE_AA,
+        )
+    return (frame, (bx, by, size, size))
+
+
+def random_tiles(
+    rng: np.random.Generator, max_rank: int = 13, side: int = GRID_SIDE_LENGTH
+) -> Tuple[int, ...]:
+    """
+    Random board with roughly 40% empty cells and tiles up to 2^max_rank.
+    """
+    ranks: np.ndarray[Any, Any] = rng.integers(1, max_rank + 1, side * side)
+    ranks[rng.random(side * side) < 0.4] = 0
+    return tuple(int(1 << r) if r else 0 for r in ranks)
+
+
+def random_frame(
+    rng: np.random.Generator,
+    tiles: Tuple[int, ...],
+    theme: Theme,
+    font: int,
+    screen: Tuple[int, int] = (1920, 1080),
+    sizes: Tuple[int, int] = (300, 700),
+) -> Tuple[Image, Rect]:
+    """
+    Renders the board at a random position and scale on the screen.
+    """
+    size: int = int(rng.integers(sizes[0], min(sizes[1], *screen) + 1))
+    pos: Tuple[int, int] = (
+        int(rng.integers(0, screen[0] - size + 1)),
+        int(rng.integers(0, screen[1] - size + 1)),
+    )
+    return render(tiles, screen, pos, size, theme, font)
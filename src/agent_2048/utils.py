@@ -1,9 +1,12 @@
+import math
 import cv2 as cv
 import numpy as np
 from .evl import Move
 from .types import Image, Symbol
-from typing import Callable, Any, Tuple, List
-from time import perf_counter
+from .acv import Segment
+from threading import Thread, Event, Lock
+from typing import Callable, Any, Tuple, List, NamedTuple
+from time import perf_counter, sleep
 
 
 def wait(key: str) -> bool:
@@ -34,150 +37,208 @@ def dbg_latency(lbl: str, rts: float, end="\r") -> None:
     print(f"{lbl}: {((rte - rts) * 1000):.3f} ms {" " * 20}", end=end)
 
 
-def show_dbg_state(
-    game_state: Tuple[Tuple[int, float], ...] | None,
-    agnt: Any,
-    rts: float,
-    grid: Image,
-    cells: List[Image],
-    is_active: bool,
-    mv: Move,
-) -> None:
-    GRID_SIDE_LENGTH: int = 4
-    GRID_CELL_COUNT: int = GRID_SIDE_LENGTH * GRID_SIDE_LENGTH
-    TMPLT_IMG_SIZE: Tuple[int, int] = (32, 64)
-    GRID_CELL_SIZE: Tuple[int, int] = (100, 100)
-    GRID_MAIN_SIZE: Tuple[int, int] = (400, 400)
-    DASHBOARD_CHANNELS: int = 3
-    CNNY_UPPER: float = 180.0
-    CNNY_LOWER: float = 60.0
-    dshbrd: Image = np.zeros(
-        dtype=np.uint8,
-        shape=(
-            TMPLT_IMG_SIZE[1] + GRID_MAIN_SIZE[1],
-            GRID_MAIN_SIZE[0] + GRID_CELL_SIZE[0] * GRID_SIDE_LENGTH,
-            DASHBOARD_CHANNELS,
-        ),
-    )
-    mgrid: Image = np.zeros(dtype=np.uint8, shape=(*GRID_MAIN_SIZE, DASHBOARD_CHANNELS))
-    rsz_shape: Tuple[int, int] = (
-        (int(grid.shape[1] * (GRID_MAIN_SIZE[1] / grid.shape[0])), GRID_MAIN_SIZE[1])
-        if grid.shape[0] > grid.shape[1]
-        else (
-            GRID_MAIN_SIZE[0],
-            int(grid.shape[0] * (GRID_MAIN_SIZE[0] / grid.shape[1])),
+class DashState(NamedTuple):
+    """
+    What the dashboard shows of one step. Only holds arrays nothing writes to
+    afterwards, so it can be rendered on another thread.
+    """
+
+    state: Tuple[Tuple[int, float], ...] | None
+    tracked: bool
+    latency: float  # ms, from the frame grab to the decision.
+    grid: Image
+    cells: List[Segment]
+    active: bool
+    move: Move
+    templates: List[Image]
+    cell_rate: float
+    value_rate: float
+
+
+class Dashboard:
+    """
+    Shows what the agent sees on its own thread. post() only keeps the newest
+    snapshot and never waits, the window is redrawn at most `fps` times a
+    second into buffers allocated once. Headless, nothing is drawn at all.
+    """
+
+    def __init__(self, fps: float = 10.0, headless: bool = False) -> None:
+        self.fps: float = fps
+        self.headless: bool = headless
+        self.shown: int = 0
+        self.skipped: int = 0  # Snapshots replaced before they were shown.
+        self._pending: DashState | None = None
+        self._lock: Lock = Lock()
+        self._posted: Event = Event()
+        self._stop: Event = Event()
+        self._thread: Thread | None = None
+        self._side: int = 0
+        self._frame: Image = np.empty(0, dtype=np.uint8)
+        self._grid: Image = np.empty(0, dtype=np.uint8)
+        self._cell: Image = np.empty(0, dtype=np.uint8)
+        if not headless:
+            self._thread = Thread(target=self._run, name="dashboard", daemon=True)
+            self._thread.start()
+
+    def post(
+        self,
+        game_state: Tuple[Tuple[int, float], ...] | None,
+        agnt: Any,
+        rts: float,
+        grid: Image,
+        cells: List[Segment],
+        is_active: bool,
+        mv: Move,
+    ) -> None:
+        """
+        Queues a step to be shown. Takes the board (anything with tracked and
+        recognizer) the step belongs to.
+        """
+        if self.headless:
+            return
+        snap: DashState = DashState(
+            game_state,
+            agnt.tracked,
+            (perf_counter() - rts) * 1000,
+            grid,
+            cells,
+            is_active,
+            mv,
+            list(agnt.recognizer.template_images),
+            agnt.recognizer.cell_hit_rate(),
+            agnt.recognizer.value_hit_rate(),
         )
-    )
-    sgrid: Image = cv.resize(cv.cvtColor(grid, cv.COLOR_RGBA2RGB), rsz_shape)
-    x: int = (mgrid.shape[1] - rsz_shape[0]) // 2
-    y: int = (mgrid.shape[0] - rsz_shape[1]) // 2
-    mgrid[y : y + sgrid.shape[0], x : x + sgrid.shape[1], :] = sgrid
-    dshbrd[: mgrid.shape[0], : mgrid.shape[1]] = mgrid[:, :, 1][:, :, np.newaxis]
-    cv.putText(
-        dshbrd,
-        "ACQUIRED" if agnt.tracked else "LOST",
-        (10, 20),
-        cv.FONT_HERSHEY_PLAIN,
-        1,
-        (0, 255, 0),
-        1,
-    )
-    if len(cells) == GRID_CELL_COUNT:
-        for y in range(GRID_SIDE_LENGTH):
-            for x in range(GRID_SIDE_LENGTH):
-                idx: int = y * GRID_SIDE_LENGTH + x
-                y_offset: int = y * GRID_CELL_SIZE[1]
-                x_offset: int = GRID_MAIN_SIZE[0] + x * GRID_CELL_SIZE[0]
-                dshbrd[
-                    y_offset : y_offset + GRID_CELL_SIZE[1],
-                    x_offset : x_offset + GRID_CELL_SIZE[0],
-                ] = cv.resize(cells[idx], GRID_CELL_SIZE)[:, :, np.newaxis]
-                cnnd: Image = cv.Canny(
-                    dshbrd[
-                        y_offset : y_offset + GRID_CELL_SIZE[1],
-                        x_offset : x_offset + GRID_CELL_SIZE[0],
-                    ],
-                    CNNY_LOWER,
-                    CNNY_UPPER,
-                )
-                if game_state:
-                    clr: Tuple[int, int, int] = (
-                        (0, 255, 0)
-                        if game_state[idx][0] & (game_state[idx][0] - 1) == 0
-                        else (0, 0, 255)
-                    )
-                    cntrs, _ = cv.findContours(
-                        cnnd, cv.RETR_EXTERNAL, cv.CHAIN_APPROX_SIMPLE
-                    )
-                    for cntr in cntrs:
-                        cx, cy, cw, ch = cv.boundingRect(cntr)
-                        cv.rectangle(
-                            dshbrd[
-                                y_offset : y_offset + GRID_CELL_SIZE[1],
-                                x_offset : x_offset + GRID_CELL_SIZE[0],
-                            ],
-                            (cx, cy),
-                            (cx + cw, cy + ch),
-                            clr,
-                            1,
-                        )
-                    cv.putText(
-                        dshbrd[
-                            y_offset : y_offset + GRID_CELL_SIZE[1],
-                            x_offset : x_offset + GRID_CELL_SIZE[0],
-                        ],
-                        f"{game_state[idx][0]} - {game_state[idx][1] * 100:.2f}%",
-                        (5, 10),
-                        cv.FONT_HERSHEY_PLAIN,
-                        0.8,
-                        clr,
-                        1,
-                    )
+        with self._lock:
+            if self._pending is not None:
+                self.skipped += 1
+            self._pending = snap
+        self._posted.set()
 
-    for i, im in enumerate(agnt.recognizer.template_images):
-        offset: int = i * TMPLT_IMG_SIZE[0]
-        dshbrd[GRID_MAIN_SIZE[1] :, offset : offset + TMPLT_IMG_SIZE[0], :] = im[
-            :, :, np.newaxis
-        ]
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self) -> None:
+        interval: float = 1.0 / self.fps if self.fps > 0 else 0.0
+        while not self._stop.is_set():
+            st: float = perf_counter()
+            # Keeps the window responsive while nothing new comes in.
+            if self._posted.wait(max(interval, 0.05)):
+                self._posted.clear()
+                with self._lock:
+                    snap: DashState | None = self._pending
+                    self._pending = None
+                if snap is not None:
+                    cv.imshow("", self._render(snap))
+                    self.shown += 1
+            wait("q")
+            sleep(max(0.0, interval - (perf_counter() - st)))
+        cv.destroyAllWindows()
+
+    def _render(self, snap: DashState) -> Image:
+        TMPLT_IMG_SIZE: Tuple[int, int] = (32, 64)
+        GRID_MAIN_SIZE: Tuple[int, int] = (400, 400)
+        DASHBOARD_CHANNELS: int = 3
+        GREEN: Tuple[int, int, int] = (0, 255, 0)
+        RED: Tuple[int, int, int] = (0, 0, 255)
+
+        side: int = math.isqrt(len(snap.cells)) or self._side or 4
+        # The cells take as much room as the grid, whatever their number.
+        csz: int = GRID_MAIN_SIZE[0] // side
+        if side != self._side:
+            self._side = side
+            self._frame = np.zeros(
+                (
+                    TMPLT_IMG_SIZE[1] + GRID_MAIN_SIZE[1],
+                    GRID_MAIN_SIZE[0] * 2,
+                    DASHBOARD_CHANNELS,
+                ),
+                dtype=np.uint8,
+            )
+            self._cell = np.zeros((csz, csz), dtype=np.uint8)
+        frame: Image = self._frame
+        frame.fill(0)
+
+        # Green channel of the grid, scaled to fit and centered.
+        gh, gw = snap.grid.shape[:2]
+        scl: float = min(GRID_MAIN_SIZE[0] / gw, GRID_MAIN_SIZE[1] / gh)
+        rsz: Tuple[int, int] = (max(int(gw * scl), 1), max(int(gh * scl), 1))
+        if self._grid.shape != rsz[::-1]:
+            self._grid = np.zeros(rsz[::-1], dtype=np.uint8)
+        cv.resize(snap.grid[:, :, 1], rsz, dst=self._grid)
+        x: int = (GRID_MAIN_SIZE[0] - rsz[0]) // 2
+        y: int = (GRID_MAIN_SIZE[1] - rsz[1]) // 2
+        frame[y : y + rsz[1], x : x + rsz[0]] = self._grid[:, :, np.newaxis]
         cv.putText(
-            dshbrd[GRID_MAIN_SIZE[1] :, offset : offset + TMPLT_IMG_SIZE[0]],
-            f"{Symbol(i) if i != Symbol.EMPTY else "E"}",
-            (5, 10),
+            frame,
+            "ACQUIRED" if snap.tracked else "LOST",
+            (10, 20),
             cv.FONT_HERSHEY_PLAIN,
-            1.0,
-            (0, 255, 0),
+            1,
+            GREEN,
             1,
         )
-    tbox: Image = dshbrd[
-        GRID_MAIN_SIZE[1] :,
-        TMPLT_IMG_SIZE[0] * len(agnt.recognizer.template_images) :,
-    ]
-    cv.putText(
-        tbox,
-        f"LATENCY: {((perf_counter() - rts) * 1000):.3f} ms",
-        (5, 10),
-        cv.FONT_HERSHEY_PLAIN,
-        0.8,
-        (0, 255, 0),
-        1,
-    )
-    cv.putText(
-        tbox,
-        f"STATUS: {"ACTIVE" if is_active else "PASSIVE"}",
-        (5, 30),
-        cv.FONT_HERSHEY_PLAIN,
-        0.8,
-        (0, 255, 0),
-        1,
-    )
-    cv.putText(
-        tbox,
-        f"MOVE: {mv.name}",
-        (5, 50),
-        cv.FONT_HERSHEY_PLAIN,
-        0.8,
-        (0, 255, 0),
-        1,
-    )
-    cv.imshow("", dshbrd)
-    wait("q")
+
+        if len(snap.cells) == side * side:
+            for idx, seg in enumerate(snap.cells):
+                y_offset: int = (idx // side) * csz
+                x_offset: int = GRID_MAIN_SIZE[0] + (idx % side) * csz
+                roi: Image = frame[y_offset : y_offset + csz, x_offset : x_offset + csz]
+                cv.resize(seg.img, (csz, csz), dst=self._cell)
+                roi[:] = self._cell[:, :, np.newaxis]
+                if not snap.state:
+                    continue
+                val, conf = snap.state[idx]
+                clr: Tuple[int, int, int] = GREEN if val & (val - 1) == 0 else RED
+                # Digit boxes come from segmentation, scaled to the shown cell.
+                sy: float = csz / max(seg.img.shape[0], 1)
+                sx: float = csz / max(seg.img.shape[1], 1)
+                for bx, by, bw, bh in seg.boxes:
+                    cv.rectangle(
+                        roi,
+                        (int(bx * sx), int(by * sy)),
+                        (int((bx + bw) * sx), int((by + bh) * sy)),
+                        clr,
+                        1,
+                    )
+                cv.putText(
+                    roi,
+                    f"{val} - {conf * 100:.2f}%",
+                    (5, 10),
+                    cv.FONT_HERSHEY_PLAIN,
+                    0.8,
+                    clr,
+                    1,
+                )
+
+        for i, im in enumerate(snap.templates):
+            offset: int = i * TMPLT_IMG_SIZE[0]
+            tile: Image = frame[
+                GRID_MAIN_SIZE[1] :, offset : offset + TMPLT_IMG_SIZE[0]
+            ]
+            tile[:] = im[:, :, np.newaxis]
+            cv.putText(
+                tile,
+                f"{Symbol(i) if i != Symbol.EMPTY else "E"}",
+                (5, 10),
+                cv.FONT_HERSHEY_PLAIN,
+                1.0,
+                GREEN,
+                1,
+            )
+        tbox: Image = frame[
+            GRID_MAIN_SIZE[1] :, TMPLT_IMG_SIZE[0] * len(snap.templates) :
+        ]
+        lines: List[Tuple[str, Tuple[int, int]]] = [
+            (f"LATENCY: {snap.latency:.3f} ms", (5, 10)),
+            (f"STATUS: {"ACTIVE" if snap.active else "PASSIVE"}", (5, 30)),
+            (f"MOVE: {snap.move.name}", (5, 50)),
+            (f"CELL CACHE: {snap.cell_rate * 100:.1f}%", (220, 10)),
+            (f"VALUE CACHE: {snap.value_rate * 100:.1f}%", (220, 30)),
+        ]
+        for text, org in lines:
+            cv.putText(tbox, text, org, cv.FONT_HERSHEY_PLAIN, 0.8, GREEN, 1)
+        return frame
@@ -0,0 +1,189 @@
+import argparse
+import json
+import sys
+import numpy as np
+from cv2.typing import Rect
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Tuple
+from .types import Image
+from .acv import (
+    detect_grid,
+    locate_grid,
+    detect_cells,
+    detect_digits,
+    get_state,
+    Recognizer,
+    Tracker,
+)
+from . import synth
+
+# A clean opening board for bootstrap(), then a board covering every digit
+# that gets fed back through add_template() like Agent._update_templates.
+START: Tuple[int, ...] = (2, 0, 0, 4, 0, 2, 0, 0, 0, 0, 0, 0, 4, 0, 0, 2)
+TEACH: Tuple[int, ...] = (1024, 2048, 512, 4096, 8, 16, 32, 64, 128, 256, 2, 4, 0, 0, 0, 0)
+STAGES: Tuple[str, ...] = (
+    "detect_grid_full",
+    "locate_grid_full",
+    "detect_grid_tracked",
+    "detect_digits",
+    "track",
+    "get_state",
+)
+
+
+def _timed(lat: List[float], func: Callable[..., Any], *args: Any) -> Any:
+    st: float = perf_counter()
+    ret: Any = func(*args)
+    lat.append((perf_counter() - st) * 1000)
+    return ret
+
+
+def _crop(frame: Image, loc: Rect) -> Image:
+    # Same region screen_cap() grabs once the board is tracked.
+    x, y, w, h = loc
+    return frame[max(y, 0) : y + h, max(x, 0) : x + w]
+
+
+def warm_up(theme: synth.Theme, font: int) -> Recognizer:
+    """
+    Prepares a recognizer the way a live session would: bootstrap on the
+    opening board, then learn the remaining digits from a labelled board.
+    """
+    rcg: Recognizer = Recognizer()
+    for tiles, teach in ((START, False), (TEACH, True)):
+        frame, _ = synth.render(tiles, theme=theme, font=font)
+        _, grid, _ = detect_grid(frame)
+        sts, digits = detect_digits(grid)
+        if not sts:
+            raise RuntimeError("Could not segment the warm-up board.")
+        get_state(digits, rcg)
+        if teach:
+            for img, v in zip(digits, tiles):
+                if v != 0:
+                    rcg.add_template(img, v)
+    return rcg
+
+
+def run(
+    frames: int,
+    seed: int,
+    screen: Tuple[int, int],
+    themes: List[str],
+    fonts: List[str],
+) -> Dict[str, Any]:
+    rng: np.random.Generator = np.random.default_rng(seed)
+    lat: Dict[str, List[float]] = {s: [] for s in STAGES}
+    counts: Dict[str, int] = {
+        "grid": 0,
+        "locate": 0,
+        "digits": 0,
+        "state": 0,
+        "board": 0,
+        "tiles": 0,
+        "track": 0,
+        "track_board": 0,
+    }
+    groups: List[Tuple[str, str]] = [(t, f) for t in themes for f in fonts]
+    for gi, (tname, fname) in enumerate(groups):
+        theme: synth.Theme = synth.THEMES[tname]
+        font: int = synth.FONTS[fname]
+        rcg: Recognizer = warm_up(theme, font)
+        n: int = frames // len(groups) + (1 if gi < frames % len(groups) else 0)
+        for _ in range(n):
+            tiles: Tuple[int, ...] = synth.random_tiles(rng)
+            frame, rect = synth.random_frame(rng, tiles, theme, font, screen)
+            sts1, _, loc = _timed(lat["detect_grid_full"], detect_grid, frame)
+            if not sts1:
+                continue
+            sts1, _, cloc = _timed(lat["locate_grid_full"], locate_grid, frame)
+            counts["locate"] += sts1 and tuple(cloc) == tuple(loc)
+            crop: Image = _crop(frame, loc)
+            sts1, grid, gloc = _timed(lat["detect_grid_tracked"], detect_grid, crop)
+            if not sts1:
+                continue
+            counts["grid"] += 1
+            sts2, digits = _timed(lat["detect_digits"], detect_digits, grid)
+            if not sts2:
+                continue
+            counts["digits"] += 1
+            sts3, state = _timed(lat["get_state"], get_state, digits, rcg)
+            if not sts3:
+                continue
+            counts["state"] += 1
+            correct: int = sum(s[0] == t for s, t in zip(state, tiles))
+            counts["tiles"] += correct
+            counts["board"] += correct == len(tiles)
+            # The board after a move: same geometry, different tiles.
+            sts2, cells = detect_cells(grid)
+            if not sts2:
+                continue
+            trk: Tracker = Tracker()
+            trk.acquire(crop, gloc, cells)
+            ntiles: Tuple[int, ...] = synth.random_tiles(rng)
+            nframe, _ = synth.render(ntiles, screen, rect[:2], rect[2], theme, font)
+            sts4, _, ndigits = _timed(lat["track"], trk.track, _crop(nframe, loc))
+            if not sts4:
+                continue
+            counts["track"] += 1
+            sts3, state = get_state(ndigits, rcg)
+            counts["track_board"] += sts3 and all(s[0] == t for s, t in zip(state, ntiles))
+    return {
+        "config": {
+            "frames": frames,
+            "seed": seed,
+            "screen": list(screen),
+            "themes": themes,
+            "fonts": fonts,
+        },
+        "latency_ms": {
+            s: {
+                "p50": float(np.percentile(v, 50)),
+                "p90": float(np.percentile(v, 90)),
+                "p99": float(np.percentile(v, 99)),
+                "mean": float(np.mean(v)),
+            }
+            for s, v in lat.items()
+            if v
+        },
+        "accuracy": {
+            "grid_detected": counts["grid"] / frames,
+            "grid_located": counts["locate"] / frames,
+            "digits_segmented": counts["digits"] / frames,
+            "state_recognized": counts["state"] / frames,
+            "board_exact": counts["board"] / frames,
+            "tile": counts["tiles"] / (frames * synth.GRID_CLL_COUNT),
+            "track_hit": counts["track"] / frames,
+            "track_board_exact": counts["track_board"] / frames,
+        },
+    }
+
+
+def main() -> None:
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(
+        prog="python -m agent_2048.vbench",
+        description="Benchmarks the vision pipeline on synthetic frames and reports JSON.",
+    )
+    parser.add_argument("-n", "--frames", type=int, default=1000)
+    parser.add_argument("-s", "--seed", type=int, default=0)
+    parser.add_argument("--screen", type=str, default="1920x1080", help="WIDTHxHEIGHT")
+    parser.add_argument(
+        "--themes", nargs="+", choices=list(synth.THEMES), default=list(synth.THEMES)
+    )
+    parser.add_argument(
+        "--fonts", nargs="+", choices=list(synth.FONTS), default=list(synth.FONTS)
+    )
+    parser.add_argument("-o", "--out", type=str, default=None, help="output file, stdout if omitted")
+    args: argparse.Namespace = parser.parse_args()
+
+    w, h = (int(v) for v in args.screen.lower().split("x"))
+    report: Dict[str, Any] = run(args.frames, args.seed, (w, h), args.themes, args.fonts)
+    out: str = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    else:
+        sys.stdout.write(out + "\n")
+
+
+if __name__ == "__main__":
+    main()
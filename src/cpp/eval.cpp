@@ -1,32 +1,67 @@
 #include "eval.hpp"
+#include <algorithm>
 #include <array>
+#include <atomic>
+#include <barrier>
+#include <bit>
+#include <chrono>
+#include <cmath>
 #include <immintrin.h>
+#include <limits>
+#include <memory>
 #include <random>
+#include <span>
+#include <thread>
+#include <vector>
 #include <x86intrin.h>
 
 namespace eval2048 {
 
+namespace detail {
+
+State pack(const std::array<std::uint16_t, cellCount> &rstate) {
+    std::array<std::uint16_t, cellCount> out{};
+    for (std::size_t i{0}; i < cellCount; ++i) {
+        out[i] = rstate[i] != 0 ? __bsfd(rstate[i]) : 0;
+    }
+    return State{out};
+}
+
+Result dispatch(const State state, const std::uint8_t type, const Budget budget, const std::size_t workers) {
+    switch (static_cast<Evaluation>(type)) {
+    case Evaluation::MC: return monteCarlo(state, budget, workers);
+    case Evaluation::MCTS: return mcts(state, budget);
+    case Evaluation::EXPMAX:
+    case Evaluation::AUTO:
+    default: return expectimax(state, budget);
+    }
+}
+
+} // namespace detail
+
 Move evaluate(const std::array<std::uint16_t, cellCount> rstate, const std::uint8_t type) {
-    std::array<std::uint16_t, cellCount> state{[&] {
-        std::array<std::uint16_t, cellCount> out{};
-        for (std::size_t i{0}; i < cellCount; ++i) {
-            out[i] = rstate[i] != 0 ? __bsfd(rstate[i]) : 0;
-        }
-        return out;
-    }()};
-    return monteCarlo(State{state});
+    return detail::dispatch(detail::pack(rstate), type, Budget{mcSimulations}, getWorkers()).move;
+}
+
+Result evaluateTimed(const std::array<std::uint16_t, cellCount> rstate, const std::uint8_t type, const double budgetMs) {
+    const auto budget{std::chrono::duration_cast<Clock::duration>(std::chrono::duration<double, std::milli>{budgetMs})};
+    return detail::dispatch(detail::pack(rstate), type, Budget{UINT64_MAX, Clock::now() + budget}, getWorkers());
 }
 
 namespace detail {
 
-std::uint32_t xorShift32() {
-    static std::random_device rd{};
-    static std::uint32_t st{rd()};
+std::atomic<std::size_t> workers{std::max(1u, std::thread::hardware_concurrency())};
+std::atomic<std::size_t> rolloutDepth{0};
+
+XorShift32::XorShift32(const std::uint32_t seed) : st{seed != 0 ? seed : 0x9E37'79B9} {}
+
+std::uint32_t XorShift32::operator()() {
     st ^= st << 13;
     st ^= st >> 17;
     st ^= st << 5;
     return st;
 }
+
 consteval std::array<std::uint64_t, UINT16_MAX + 1> initRLut() {
     std::array<std::uint64_t, UINT16_MAX + 1> out{};
     for (std::uint64_t e{0}; e < UINT16_MAX + 1; ++e) {
@@ -41,80 +76,733 @@ consteval std::array<std::uint64_t, UINT16_MAX + 1> initRLut() {
     return out;
 }
 constexpr std::array<std::uint64_t, UINT16_MAX + 1> rLut{initRLut()};
-State randTile(const State in) {
-    const std::uint64_t t{xorShift32() % 10 == 9 ? 2ull : 1ull};
+
+// Sets the LSB of every nibble that holds an empty tile.
+constexpr std::uint64_t empty(const State s) {
     constexpr std::uint64_t m4{0xCCCC'CCCC'CCCC'CCCC};
     constexpr std::uint64_t m2{0xAAAA'AAAA'AAAA'AAAA};
     constexpr std::uint64_t mLsb{0x1111'1111'1111'1111};
-    const std::uint64_t i4{in.data | ((in.data & m4) >> 2)};
-    const std::uint64_t r{(~(i4 | ((i4 & m2) >> 1)) & mLsb)};
+    const std::uint64_t i4{s.data | ((s.data & m4) >> 2)};
+    return ~(i4 | ((i4 & m2) >> 1)) & mLsb;
+}
+
+State randTile(const State in, XorShift32 &rng) {
+    const std::uint64_t t{rng() % 10 == 9 ? 2ull : 1ull};
+    constexpr std::uint64_t mLsb{0x1111'1111'1111'1111};
+    const std::uint64_t r{empty(in)};
     if (r == 0) {
         return in;
     }
     const std::uint64_t lutIdx{_pext_u64(r, mLsb)};
     const std::uint64_t cnt{static_cast<std::uint64_t>(_mm_popcnt_u64(lutIdx))};
-    const std::uint64_t loc{xorShift32() % cnt};
+    const std::uint64_t loc{rng() % cnt};
     return State{in.data | t << (((rLut[lutIdx] >> (loc * 4)) & 0xF) * 4)};
 }
 
+/*
+    Heuristic library. Every feature is a 65536-entry table indexed by a 16-bit row,
+    scored once per row and once per column of a board. The tables are combined into
+    a single weighted table so a board costs 8 lookups regardless of the feature count.
+    Not consteval, std::pow isn't usable in constant expressions. Wide boards (grid.cpp)
+    score their rows with the same rowFeatures() and weigh() directly.
+*/
+using HLut = std::array<float, lutEntries>;
+
+struct Features {
+    HLut empty{};  // Empty cells.
+    HLut merge{};  // Runs of adjacent equal tiles.
+    HLut mono{};   // Non-monotonicity, the smaller of the two directions.
+    HLut sum{};    // Sum of ranks^3.5, penalizes large tiles.
+    HLut smooth{}; // Rank differences between adjacent non-empty tiles.
+    HLut corner{}; // Squared ranks of the two edge cells, counted twice at corners.
+};
+
+// Powers of every rank a cell can hold, wide cells included.
+struct RankPowers {
+    std::array<float, 32> mono{};
+    std::array<float, 32> sum{};
+    std::array<float, 32> corner{};
+};
+
+const RankPowers &rankPowers() {
+    static const RankPowers p{[] {
+        constexpr float monoPow{4.0f};
+        constexpr float sumPow{3.5f};
+        constexpr float cornerPow{2.0f};
+        RankPowers out{};
+        for (std::size_t r{0}; r < out.sum.size(); ++r) {
+            out.mono[r] = std::pow(static_cast<float>(r), monoPow);
+            out.sum[r] = std::pow(static_cast<float>(r), sumPow);
+            out.corner[r] = std::pow(static_cast<float>(r), cornerPow);
+        }
+        return out;
+    }()};
+    return p;
+}
+
+RowFeatures rowFeatures(const std::span<const std::uint8_t> ln) {
+    const RankPowers &p{rankPowers()};
+    RowFeatures out{};
+    std::uint16_t prev{};
+    std::uint16_t counter{};
+    for (const std::uint8_t rank : ln) {
+        out.sum += p.sum[rank];
+        if (rank == 0) {
+            out.empty++;
+            continue;
+        }
+        if (prev == rank) {
+            counter++;
+        } else if (counter > 0) {
+            out.merge += 1 + counter;
+            counter = 0;
+        }
+        prev = rank;
+    }
+    if (counter > 0) {
+        out.merge += 1 + counter;
+    }
+    float monoL{};
+    float monoR{};
+    for (std::size_t i{1}; i < ln.size(); ++i) {
+        const float a{p.mono[ln[i - 1]]};
+        const float b{p.mono[ln[i]]};
+        if (ln[i - 1] > ln[i]) {
+            monoL += a - b;
+        } else {
+            monoR += b - a;
+        }
+        if (ln[i - 1] != 0 && ln[i] != 0) {
+            out.smooth += std::abs(static_cast<float>(ln[i - 1]) - static_cast<float>(ln[i]));
+        }
+    }
+    out.mono = std::min(monoL, monoR);
+    out.corner = p.corner[ln.front()] + p.corner[ln.back()];
+    return out;
+}
+
+float weigh(const Weights &w, const RowFeatures &f) {
+    return w.lost + f.empty * w.empty + f.merge * w.merge - f.mono * w.mono - f.sum * w.sum - f.smooth * w.smooth +
+           f.corner * w.corner;
+}
+
+std::unique_ptr<const Features> initFeatures() {
+    // Heap allocated, the tables are too large for the stack.
+    auto out{std::make_unique<Features>()};
+    for (std::uint32_t r{0}; r <= UINT16_MAX; ++r) {
+        std::array<std::uint8_t, 4> ln{};
+        for (std::size_t i{0}; i < 4; ++i) {
+            ln[i] = (r >> (i * 4)) & 0xF;
+        }
+        const RowFeatures f{rowFeatures(ln)};
+        out->empty[r] = f.empty;
+        out->merge[r] = f.merge;
+        out->mono[r] = f.mono;
+        out->sum[r] = f.sum;
+        out->smooth[r] = f.smooth;
+        out->corner[r] = f.corner;
+    }
+    return out;
+}
+
+const Features &features() {
+    static const std::unique_ptr<const Features> f{initFeatures()};
+    return *f;
+}
+
+struct Heuristic {
+    Weights weights{};
+    HLut lut{};
+};
+
+std::shared_ptr<const Heuristic> combine(const Weights &w) {
+    const Features &f{features()};
+    auto out{std::make_shared<Heuristic>()};
+    out->weights = w;
+    for (std::size_t r{0}; r < lutEntries; ++r) {
+        out->lut[r] = weigh(w, RowFeatures{f.empty[r], f.merge[r], f.mono[r], f.sum[r], f.smooth[r], f.corner[r]});
+    }
+    return out;
+}
+
+// Searches take a snapshot at the start, so set_weights() never changes a table mid-search.
+std::atomic<std::shared_ptr<const Heuristic>> heuristics{combine(Weights{})};
+
+float heuristic(const State s, const HLut &h) {
+    constexpr std::uint64_t m{0xFFFF};
+    const State t{transpose(s)};
+    return h[s.data & m] + h[(s.data >> 16) & m] + h[(s.data >> 32) & m] + h[(s.data >> 48) & m] + h[t.data & m] +
+           h[(t.data >> 16) & m] + h[(t.data >> 32) & m] + h[(t.data >> 48) & m];
+}
+
+// Value of a rollout's final board, lost boards are worth nothing.
+float leafValue(const State s, const HLut &h) { return s.ended() ? 0.0f : heuristic(s, h); }
+
+std::size_t distinctTiles(const State s) {
+    std::uint16_t seen{};
+    for (std::size_t i{0}; i < cellCount; ++i) {
+        seen |= 1 << ((s.data >> (i * 4)) & 0xF);
+    }
+    return std::popcount(static_cast<std::uint16_t>(seen & ~1));
+}
+
+struct TtEntry {
+    std::uint64_t key{};
+    float value{};
+    std::uint16_t depth{};
+    std::uint16_t gen{};
+};
+
+class Expectimax {
+  public:
+    Expectimax() : table(ttEntries) {}
+
+    Result search(const State s, const Budget budget) {
+        // Bumping the generation invalidates every entry without touching the table.
+        if (++gen == 0) {
+            std::fill(table.begin(), table.end(), TtEntry{});
+            gen = 1;
+        }
+        nodes = 0;
+        h = heuristics.load();
+        aborted = false;
+        deadline = budget.deadline;
+        /*
+            Untimed searches go straight to a depth scaled by the number of distinct tiles.
+            Timed searches deepen iteratively, only keeping results of completed iterations.
+            The first iteration is never aborted so there is always a move to return.
+        */
+        const std::size_t target{
+            budget.timed() ? maxTimedDepth
+                           : std::clamp<std::size_t>(distinctTiles(s), minDepth + 2, maxDepth + 2) - 2
+        };
+        Result res{};
+        for (std::size_t depth{budget.timed() ? 1 : target}; depth <= target && !aborted; ++depth) {
+            abortable = depth > 1;
+            std::array<float, 4> scores{};
+            Move mxMv{Move::NONE};
+            float mxSc{-1.0f};
+            for (const Move m : {Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT}) {
+                std::uint64_t sc{};
+                const State ns{move(s, m, sc)};
+                if (ns.data == s.data) {
+                    continue;
+                }
+                const float v{chanceNode(ns, depth, 1.0f)};
+                scores[static_cast<std::size_t>(m)] = v;
+                if (v > mxSc) {
+                    mxMv = m;
+                    mxSc = v;
+                }
+            }
+            if (aborted) {
+                break;
+            }
+            res.move = mxMv;
+            res.scores = scores;
+            res.depth = depth;
+        }
+        res.iterations = nodes;
+        return res;
+    }
+
+  private:
+    static constexpr std::size_t ttBits{20};
+    static constexpr std::size_t ttEntries{1 << ttBits};
+    static constexpr std::size_t minDepth{2};
+    static constexpr std::size_t maxDepth{5};
+    static constexpr std::size_t maxTimedDepth{8};
+    static constexpr std::uint64_t clockInterval{1024};
+    static constexpr float probThreshold{1e-4f};
+    std::vector<TtEntry> table;
+    std::shared_ptr<const Heuristic> h{};
+    std::uint16_t gen{};
+    std::uint64_t nodes{};
+    Clock::time_point deadline{};
+    bool abortable{};
+    bool aborted{};
+
+    TtEntry &slot(const State s) { return table[(s.data * 0x9E37'79B9'7F4A'7C15ull) >> (64 - ttBits)]; }
+
+    float maxNode(const State s, const std::size_t depth, const float prob) {
+        float mx{};
+        for (const Move m : {Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT}) {
+            std::uint64_t sc{};
+            const State ns{move(s, m, sc)};
+            if (ns.data == s.data) {
+                continue;
+            }
+            mx = std::max(mx, chanceNode(ns, depth - 1, prob));
+        }
+        return mx;
+    }
+
+    float chanceNode(const State s, const std::size_t depth, const float prob) {
+        if (++nodes % clockInterval == 0 && abortable && Clock::now() >= deadline) {
+            aborted = true;
+        }
+        if (aborted) {
+            return 0.0f;
+        }
+        if (depth == 0 || prob < probThreshold) {
+            return heuristic(s, h->lut);
+        }
+        TtEntry &e{slot(s)};
+        if (e.gen == gen && e.key == s.data && e.depth >= depth) {
+            return e.value;
+        }
+        std::uint64_t r{empty(s)};
+        const float cnt{static_cast<float>(std::popcount(r))};
+        float v{};
+        while (r != 0) {
+            const std::size_t sh{static_cast<std::size_t>(std::countr_zero(r))};
+            v += maxNode(State{s.data | (1ull << sh)}, depth, prob * 0.9f / cnt) * 0.9f;
+            v += maxNode(State{s.data | (2ull << sh)}, depth, prob * 0.1f / cnt) * 0.1f;
+            r &= r - 1;
+        }
+        // Partial sums of an aborted iteration must never reach the table.
+        if (aborted) {
+            return 0.0f;
+        }
+        v /= cnt;
+        e = TtEntry{s.data, v, static_cast<std::uint16_t>(depth), gen};
+        return v;
+    }
+};
+
 } // namespace detail
 
-Move monteCarlo(const State state) {
-    static std::array<float, 2> weights{0.5f, 2.0f};
-    constexpr std::size_t simulations{200'000};
-    constexpr std::array<Move, 4> moves{Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT};
-    std::array<std::uint64_t, 4> simCounts{};
-    std::array<std::uint64_t, 4> steps{};
-    std::array<std::uint64_t, 4> scores{};
+std::size_t getWorkers() { return detail::workers.load(); }
+
+std::size_t getRolloutDepth() { return detail::rolloutDepth.load(); }
+
+void setRolloutDepth(const std::size_t depth) { detail::rolloutDepth.store(depth); }
+
+Weights getWeights() { return detail::heuristics.load()->weights; }
+
+void setWeights(const Weights &weights) { detail::heuristics.store(detail::combine(weights)); }
+
+void setWorkers(const std::size_t n) {
+    detail::workers.store(n != 0 ? n : std::max(1u, std::thread::hardware_concurrency()));
+}
+
+Result expectimax(const State state, const Budget budget) {
+    // One engine (and transposition table) per calling thread, evaluate() runs without the GIL.
+    thread_local detail::Expectimax engine{};
+    const Clock::time_point st{Clock::now()};
     if (state.ended()) {
-        return Move::NONE;
+        return Result{};
     }
-    for (std::size_t s{0}; s < simulations; ++s) {
-        State st{state};
-        Move imv{moves[detail::xorShift32() % 4]};
-        State imvst = detail::move(st, imv, scores[static_cast<std::size_t>(imv)]);
-        if (st.data == imvst.data) {
-            continue;
+    Result res{engine.search(state, budget)};
+    res.elapsed = std::chrono::duration<double, std::milli>{Clock::now() - st}.count();
+    return res;
+}
+
+namespace detail {
+
+struct MctsNode {
+    std::uint64_t state{};
+    double value{};          // Sum of rewards backed up through this node.
+    std::uint32_t visits{};
+    std::uint32_t child{};   // First child, 0 while unexpanded (0 is always the root).
+    std::uint32_t sibling{}; // Next child of the same parent, 0 ends the list.
+    Move move{Move::NONE};   // Move leading into an afterstate node.
+};
+
+class Mcts {
+  public:
+    Mcts() : pool(poolSize) { path.reserve(poolSize); }
+
+    Result search(const State s, const Budget budget, XorShift32 rng) {
+        /*
+            Decision nodes (player to move) alternate with afterstate nodes (spawn pending).
+            Decision nodes pick an afterstate via UCT, afterstates sample a spawn with randTile
+            and descend into the matching decision node, adding it if it hasn't been seen yet.
+            Once the pool is full the tree stops growing and rollouts start at the frontier.
+        */
+        used = 1;
+        pool[0] = MctsNode{s.data};
+        h = heuristics.load();
+        depth = rolloutDepth.load();
+        Result res{};
+        for (std::uint64_t it{0}; it < budget.iterations; ++it) {
+            if (it % clockInterval == 0 && Clock::now() >= budget.deadline) {
+                break;
+            }
+            iterate(rng);
+            res.iterations++;
         }
-        imvst = detail::randTile(imvst);
-        while (!imvst.ended()) {
-            steps[static_cast<std::size_t>(imv)]++;
-            Move mv{moves[detail::xorShift32() % 4]};
-            State ost{imvst};
-            imvst = detail::move(imvst, mv, scores[static_cast<std::size_t>(imv)]);
-            if (imvst.data == ost.data) {
+        std::uint32_t mxVisits{0};
+        for (std::uint32_t c{pool[0].child}; c != 0; c = pool[c].sibling) {
+            const MctsNode &n{pool[c]};
+            if (n.visits == 0) {
                 continue;
             }
-            imvst = detail::randTile(imvst);
-        }
-        simCounts[static_cast<std::size_t>(imv)]++;
-    };
-    float ssc{};
-    float sst{};
-    std::array<float, 4> avgSc{};
-    std::array<float, 4> avgSt{};
-    std::array<float, 4> fRate{};
-    for (std::size_t i{}; i < 4; ++i) {
-        if (simCounts[i] == 0) {
+            res.scores[static_cast<std::size_t>(n.move)] = static_cast<float>(n.value / n.visits);
+            res.counts[static_cast<std::size_t>(n.move)] = n.visits;
+            // Most visited child, more robust than the highest mean.
+            if (n.visits > mxVisits) {
+                mxVisits = n.visits;
+                res.move = n.move;
+            }
+        }
+        return res;
+    }
+
+  private:
+    static constexpr std::size_t poolSize{1 << 20};
+    static constexpr std::uint64_t clockInterval{16};
+    static constexpr double exploration{2.0};
+    std::vector<MctsNode> pool;
+    std::vector<std::uint32_t> path;
+    std::shared_ptr<const Heuristic> h{};
+    std::size_t depth{};
+    std::uint32_t used{};
+
+    bool full() const { return used + 4 > pool.size(); }
+
+    std::uint32_t add(const MctsNode n, const std::uint32_t parent) {
+        const std::uint32_t idx{used++};
+        pool[idx] = n;
+        pool[idx].sibling = pool[parent].child;
+        pool[parent].child = idx;
+        return idx;
+    }
+
+    void expand(const std::uint32_t idx) {
+        const State s{pool[idx].state};
+        for (const Move m : {Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT}) {
+            std::uint64_t sc{};
+            const State ns{move(s, m, sc)};
+            if (ns.data != s.data) {
+                add(MctsNode{.state = ns.data, .move = m}, idx);
+            }
+        }
+    }
+
+    std::uint32_t select(const std::uint32_t idx) const {
+        // Means are min-max normalized among siblings, rewards are unbounded.
+        double mn{std::numeric_limits<double>::max()};
+        double mx{0.0};
+        for (std::uint32_t c{pool[idx].child}; c != 0; c = pool[c].sibling) {
+            if (pool[c].visits == 0) {
+                return c;
+            }
+            const double q{pool[c].value / pool[c].visits};
+            mn = std::min(mn, q);
+            mx = std::max(mx, q);
+        }
+        const double range{mx > mn ? mx - mn : 1.0};
+        const double lnN{std::log(static_cast<double>(pool[idx].visits))};
+        std::uint32_t best{pool[idx].child};
+        double bestUct{-1.0};
+        for (std::uint32_t c{pool[idx].child}; c != 0; c = pool[c].sibling) {
+            const double q{(pool[c].value / pool[c].visits - mn) / range};
+            const double uct{q + exploration * std::sqrt(lnN / pool[c].visits)};
+            if (uct > bestUct) {
+                best = c;
+                bestUct = uct;
+            }
+        }
+        return best;
+    }
+
+    void iterate(XorShift32 &rng) {
+        path.clear();
+        std::uint64_t reward{};
+        std::uint32_t idx{0};
+        State leaf{pool[0].state};
+        while (true) {
+            path.push_back(idx);
+            const State s{pool[idx].state};
+            if (pool[idx].child == 0 && ((pool[idx].visits == 0 && idx != 0) || full() || s.ended())) {
+                leaf = s;
+                break;
+            }
+            if (pool[idx].child == 0) {
+                expand(idx);
+            }
+            const std::uint32_t a{select(idx)};
+            path.push_back(a);
+            move(s, pool[a].move, reward);
+            const State spawned{randTile(State{pool[a].state}, rng)};
+            std::uint32_t next{0};
+            for (std::uint32_t c{pool[a].child}; c != 0; c = pool[c].sibling) {
+                if (pool[c].state == spawned.data) {
+                    next = c;
+                    break;
+                }
+            }
+            if (next == 0) {
+                if (full()) {
+                    leaf = spawned;
+                    break;
+                }
+                next = add(MctsNode{.state = spawned.data}, a);
+            }
+            idx = next;
+        }
+        const double value{static_cast<double>(reward) + rollout(leaf, rng)};
+        for (const std::uint32_t n : path) {
+            pool[n].visits++;
+            pool[n].value += value;
+        }
+    }
+
+    double rollout(State s, XorShift32 &rng) const {
+        // Plays to game over, or for `depth` moves and scores the final board with the heuristic.
+        constexpr std::array<Move, 4> moves{Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT};
+        std::uint64_t sc{};
+        for (std::size_t d{0}; !s.ended() && (depth == 0 || d < depth); ++d) {
+            const State ns{move(s, moves[rng() % 4], sc)};
+            if (ns.data != s.data) {
+                s = randTile(ns, rng);
+            }
+        }
+        return static_cast<double>(sc) + (depth != 0 ? leafValue(s, h->lut) : 0.0);
+    }
+};
+
+} // namespace detail
+
+Result mcts(const State state, const Budget budget) {
+    // Same as expectimax, one node pool per calling thread, allocated once.
+    thread_local detail::Mcts engine{};
+    const Clock::time_point st{Clock::now()};
+    if (state.ended()) {
+        return Result{};
+    }
+    Result res{engine.search(state, budget, detail::XorShift32{std::random_device{}()})};
+    res.elapsed = std::chrono::duration<double, std::milli>{Clock::now() - st}.count();
+    return res;
+}
+
+namespace detail {
+
+// Padded to a cache line so workers don't false-share their counters.
+struct alignas(64) McAccumulator {
+    std::uint64_t iterations{};
+    std::array<std::uint64_t, 4> simCounts{};
+    // Per rollout, x is the merge score and y the survived steps (the leaf value when cut off).
+    std::array<double, 4> x{};
+    std::array<double, 4> y{};
+    std::array<double, 4> xx{};
+    std::array<double, 4> yy{};
+    std::array<double, 4> xy{};
+};
+
+// Reduced statistics of every root move.
+struct McArms {
+    std::array<std::uint64_t, 4> counts{};
+    std::array<float, 4> means{};
+    std::array<float, 4> confidence{};
+};
+
+void mcRollout(
+    const State state, const Move imv, XorShift32 &rng, const std::size_t depth, const Heuristic &h,
+    McAccumulator &acc
+) {
+    constexpr std::array<Move, 4> moves{Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT};
+    std::uint64_t sc{};
+    std::uint64_t steps{};
+    State st{randTile(move(state, imv, sc), rng)};
+    for (std::size_t d{0}; !st.ended() && (depth == 0 || d < depth); ++d) {
+        steps++;
+        const State ns{move(st, moves[rng() % 4], sc)};
+        if (ns.data != st.data) {
+            st = randTile(ns, rng);
+        }
+    }
+    const std::size_t i{static_cast<std::size_t>(imv)};
+    const double x{static_cast<double>(sc)};
+    const double y{depth != 0 ? leafValue(st, h.lut) : static_cast<double>(steps)};
+    acc.iterations++;
+    acc.simCounts[i]++;
+    acc.x[i] += x;
+    acc.y[i] += y;
+    acc.xx[i] += x * x;
+    acc.yy[i] += y * y;
+    acc.xy[i] += x * y;
+}
+
+McArms mcReduce(const std::vector<McAccumulator> &accs, const bool cutoff) {
+    /*
+        A move is rated a * mean(x) + b * mean(y). Full playouts weigh score and survival
+        relative to their sums over all moves, cut off ones just add score and leaf value.
+        The rating is linear in x and y so its variance follows from the second moments.
+    */
+    constexpr std::array<double, 2> weights{0.5, 2.0};
+    constexpr double z{2.576};
+    std::array<double, 4> n{};
+    std::array<double, 4> x{};
+    std::array<double, 4> y{};
+    std::array<double, 4> xx{};
+    std::array<double, 4> yy{};
+    std::array<double, 4> xy{};
+    McArms arms{};
+    for (const McAccumulator &acc : accs) {
+        for (std::size_t i{0}; i < 4; ++i) {
+            arms.counts[i] += acc.simCounts[i];
+            x[i] += acc.x[i];
+            y[i] += acc.y[i];
+            xx[i] += acc.xx[i];
+            yy[i] += acc.yy[i];
+            xy[i] += acc.xy[i];
+        }
+    }
+    double sx{};
+    double sy{};
+    for (std::size_t i{0}; i < 4; ++i) {
+        n[i] = static_cast<double>(arms.counts[i]);
+        if (n[i] != 0.0) {
+            sx += x[i] / n[i];
+            sy += y[i] / n[i];
+        }
+    }
+    // Guards against 0/0 when every rollout of a move ends instantly.
+    const double a{cutoff ? 1.0 : (sx > 0.0 ? weights[0] / sx : 0.0)};
+    const double b{cutoff ? 1.0 : (sy > 0.0 ? weights[1] / sy : 0.0)};
+    for (std::size_t i{0}; i < 4; ++i) {
+        if (n[i] == 0.0) {
             continue;
         }
-        avgSc[i] = static_cast<float>(scores[i]) / simCounts[i];
-        avgSt[i] = static_cast<float>(steps[i]) / simCounts[i];
-        ssc += avgSc[i];
-        sst += avgSt[i];
+        const double mx{x[i] / n[i]};
+        const double my{y[i] / n[i]};
+        const double vx{xx[i] / n[i] - mx * mx};
+        const double vy{yy[i] / n[i] - my * my};
+        const double cxy{xy[i] / n[i] - mx * my};
+        const double var{std::max(0.0, a * a * vx + b * b * vy + 2.0 * a * b * cxy)};
+        arms.means[i] = static_cast<float>(a * mx + b * my);
+        arms.confidence[i] = static_cast<float>(z * std::sqrt(var / n[i]));
+    }
+    return arms;
+}
+
+Result monteCarlo(const State state, const Budget budget, const std::size_t workers) {
+    /*
+        Rollouts are spent in rounds over the legal root moves that are still in the race.
+        After every round, moves whose upper confidence bound falls below the best lower
+        bound are dropped, and the search stops once a single move is left.
+    */
+    constexpr std::array<Move, 4> moves{Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT};
+    constexpr std::uint64_t roundSize{256};
+    constexpr std::uint64_t clockInterval{16};
+    const Clock::time_point st{Clock::now()};
+    if (state.ended()) {
+        return Result{};
+    }
+    Result res{};
+    std::array<bool, 4> active{};
+    std::size_t remaining{0};
+    for (std::size_t i{0}; i < 4; ++i) {
+        std::uint64_t sc{};
+        active[i] = move(state, moves[i], sc).data != state.data;
+        if (active[i]) {
+            remaining++;
+            res.move = moves[i];
+        }
+    }
+    if (remaining == 1) {
+        res.elapsed = std::chrono::duration<double, std::milli>{Clock::now() - st}.count();
+        return res;
     }
-    for (std::size_t i{}; i < 4; ++i) {
-        fRate[i] = (avgSc[i] / ssc) * weights[0] + (avgSt[i] / sst) * weights[1];
+    const std::size_t n{std::max<std::size_t>(workers, 1)};
+    const std::size_t depth{rolloutDepth.load()};
+    const std::shared_ptr<const Heuristic> h{heuristics.load()};
+    std::vector<McAccumulator> accs(n);
+    McArms arms{};
+    std::uint64_t spent{0};
+    const auto plan{[&]() { return std::min(roundSize, (budget.iterations - spent) / remaining); }};
+    std::uint64_t perArm{plan()};
+    bool done{perArm == 0};
+    // Runs on one thread once every worker finished the round, before any of them starts the next.
+    const auto complete{[&]() noexcept {
+        arms = mcReduce(accs, depth != 0);
+        spent = 0;
+        float bestLow{std::numeric_limits<float>::lowest()};
+        for (std::size_t i{0}; i < 4; ++i) {
+            spent += arms.counts[i];
+            if (active[i]) {
+                bestLow = std::max(bestLow, arms.means[i] - arms.confidence[i]);
+            }
+        }
+        for (std::size_t i{0}; i < 4; ++i) {
+            if (active[i] && arms.means[i] + arms.confidence[i] < bestLow) {
+                active[i] = false;
+                remaining--;
+            }
+        }
+        perArm = plan();
+        done = remaining <= 1 || perArm == 0 || Clock::now() >= budget.deadline;
+    }};
+    std::barrier sync{static_cast<std::ptrdiff_t>(n), complete};
+    const auto worker{[&](const std::size_t w, XorShift32 rng) {
+        while (!done) {
+            const std::uint64_t share{perArm / n + (w < perArm % n ? 1 : 0)};
+            for (std::size_t i{0}; i < 4; ++i) {
+                for (std::uint64_t s{0}; active[i] && s < share; ++s) {
+                    if (s % clockInterval == 0 && Clock::now() >= budget.deadline) {
+                        break;
+                    }
+                    mcRollout(state, moves[i], rng, depth, *h, accs[w]);
+                }
+            }
+            sync.arrive_and_wait();
+        }
+    }};
+    {
+        // Every worker gets its own RNG stream and accumulators. The calling thread is worker 0,
+        // so batch evaluation (one worker per board) never spawns a nested pool.
+        std::random_device rd{};
+        std::vector<std::jthread> pool{};
+        pool.reserve(n - 1);
+        for (std::size_t w{1}; w < n; ++w) {
+            pool.emplace_back(worker, w, XorShift32{rd()});
+        }
+        worker(0, XorShift32{rd()});
     }
-    Move mxMv{Move::NONE};
-    float mxSc{-1.0f};
+    float mxSc{std::numeric_limits<float>::lowest()};
     for (std::size_t i{0}; i < 4; ++i) {
-        if (fRate[i] > mxSc) {
-            mxMv = moves[i];
-            mxSc = fRate[i];
+        res.iterations += arms.counts[i];
+        if (active[i] && arms.counts[i] != 0 && arms.means[i] > mxSc) {
+            res.move = moves[i];
+            mxSc = arms.means[i];
+        }
+    }
+    res.scores = arms.means;
+    res.counts = arms.counts;
+    res.confidence = arms.confidence;
+    res.elapsed = std::chrono::duration<double, std::milli>{Clock::now() - st}.count();
+    return res;
+}
+
+} // namespace detail
+
+Result monteCarlo(const State state, const Budget budget) { return detail::monteCarlo(state, budget, getWorkers()); }
+
+void evaluateBatch(
+    const std::span<const std::uint64_t> states, const std::uint8_t type, const std::span<Move> moves,
+    const std::span<std::array<float, 4>> scores
+) {
+    /*
+        Boards are handed out one at a time from a shared counter so a few slow
+        positions don't leave the other workers idle. Each board is searched on a
+        single thread, parallelism comes from evaluating many boards at once.
+    */
+    const std::size_t n{std::min(getWorkers(), states.size())};
+    std::atomic<std::size_t> next{0};
+    const auto worker{[&]() {
+        for (std::size_t i{next.fetch_add(1)}; i < states.size(); i = next.fetch_add(1)) {
+            const Result res{detail::dispatch(State{states[i]}, type, Budget{mcSimulations}, 1)};
+            moves[i] = res.move;
+            scores[i] = res.scores;
         }
+    }};
+    std::vector<std::jthread> pool{};
+    pool.reserve(n);
+    for (std::size_t w{0}; w < n; ++w) {
+        pool.emplace_back(worker);
     }
-    return mxMv;
 }
 
 } // namespace eval2048
\ No newline at end of file
@@ -1,4 +1,31 @@
 #include "eval.hpp"
+#include <pybind11/numpy.h>
+#include <stdexcept>
+
+namespace {
+
+using States = pybind11::array_t<std::uint64_t, pybind11::array::c_style>;
+using Moves = pybind11::array_t<std::uint8_t, pybind11::array::c_style>;
+using Scores = pybind11::array_t<float, pybind11::array::c_style>;
+
+void evaluateBatch(const States &states, const std::uint8_t type, Moves &moves, Scores &scores) {
+    // Arrays are taken as-is (noconvert), results are written straight into the caller's buffers.
+    const std::size_t n{static_cast<std::size_t>(states.size())};
+    if (states.ndim() != 1 || moves.ndim() != 1 || moves.shape(0) != states.shape(0)) {
+        throw std::invalid_argument("states and moves must be 1-D arrays of the same length.");
+    }
+    if (scores.ndim() != 2 || scores.shape(0) != states.shape(0) || scores.shape(1) != 4) {
+        throw std::invalid_argument("scores must be an (N, 4) array.");
+    }
+    const std::span<const std::uint64_t> st{states.data(), n};
+    const std::span<eval2048::Move> mv{reinterpret_cast<eval2048::Move *>(moves.mutable_data()), n};
+    const std::span<std::array<float, 4>> sc{reinterpret_cast<std::array<float, 4> *>(scores.mutable_data()), n};
+    pybind11::gil_scoped_release release{};
+    eval2048::evaluateBatch(st, type, mv, sc);
+}
+
+} // namespace
+
 
 PYBIND11_MODULE(eval, module) {
     pybind11::enum_<eval2048::Move>(module, "Move")
@@ -12,5 +39,38 @@ PYBIND11_MODULE(eval, module) {
         .value("MC", eval2048::Evaluation::MC)
         .value("MCTS", eval2048::Evaluation::MCTS)
         .value("EXPMAX", eval2048::Evaluation::EXPMAX);
-    module.def("evaluate", &eval2048::evaluate);
+    pybind11::class_<eval2048::Result>(module, "Result")
+        .def_readonly("move", &eval2048::Result::move)
+        .def_readonly("scores", &eval2048::Result::scores)
+        .def_readonly("iterations", &eval2048::Result::iterations)
+        .def_readonly("depth", &eval2048::Result::depth)
+        .def_readonly("elapsed", &eval2048::Result::elapsed)
+        .def_readonly("counts", &eval2048::Result::counts)
+        .def_readonly("confidence", &eval2048::Result::confidence);
+    module.def("evaluate", &eval2048::evaluate, pybind11::call_guard<pybind11::gil_scoped_release>());
+    module.def(
+        "evaluate_timed", &eval2048::evaluateTimed, pybind11::call_guard<pybind11::gil_scoped_release>()
+    );
+    module.def(
+        "evaluate_grid", &eval2048::evaluateGrid, pybind11::call_guard<pybind11::gil_scoped_release>()
+    );
+    pybind11::class_<eval2048::Weights>(module, "Weights")
+        .def(pybind11::init<>())
+        .def_readwrite("lost", &eval2048::Weights::lost)
+        .def_readwrite("empty", &eval2048::Weights::empty)
+        .def_readwrite("merge", &eval2048::Weights::merge)
+        .def_readwrite("mono", &eval2048::Weights::mono)
+        .def_readwrite("sum", &eval2048::Weights::sum)
+        .def_readwrite("smooth", &eval2048::Weights::smooth)
+        .def_readwrite("corner", &eval2048::Weights::corner);
+    module.def(
+        "evaluate_batch", &evaluateBatch, pybind11::arg("states").noconvert(), pybind11::arg("type"),
+        pybind11::arg("moves").noconvert(), pybind11::arg("scores").noconvert()
+    );
+    module.def("get_workers", &eval2048::getWorkers);
+    module.def("set_workers", &eval2048::setWorkers);
+    module.def("get_rollout_depth", &eval2048::getRolloutDepth);
+    module.def("set_rollout_depth", &eval2048::setRolloutDepth);
+    module.def("get_weights", &eval2048::getWeights);
+    module.def("set_weights", &eval2048::setWeights);
 }
\ No newline at end of file
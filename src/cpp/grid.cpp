@@ -0,0 +1,219 @@
+#include "grid.hpp"
+#include <algorithm>
+#include <array>
+#include <bit>
+#include <chrono>
+#include <cmath>
+#include <stdexcept>
+#include <vector>
+
+namespace eval2048 {
+
+namespace detail {
+
+template <std::size_t N> std::size_t distinctTiles(const Grid<N> &g) {
+    std::uint32_t seen{};
+    for (std::size_t r{0}; r < N; ++r) {
+        for (std::size_t c{0}; c < N; ++c) {
+            seen |= 1u << g.at(r, c);
+        }
+    }
+    return std::popcount(seen & ~1u);
+}
+
+/*
+    Same search as Expectimax in eval.cpp, over Grid<N>. Rows are scored with the
+    row features directly, there is no table for them. Merge scores aren't tracked,
+    expectimax doesn't use them.
+*/
+template <std::size_t N> class GridExpectimax {
+  public:
+    GridExpectimax() : table(ttEntries) {}
+
+    Result search(const Grid<N> &s, const Budget budget) {
+        if (++gen == 0) {
+            std::fill(table.begin(), table.end(), Entry{});
+            gen = 1;
+        }
+        nodes = 0;
+        weights = getWeights();
+        aborted = false;
+        deadline = budget.deadline;
+        const std::size_t target{
+            budget.timed() ? maxTimedDepth
+                           : std::clamp<std::size_t>(distinctTiles(s), minDepth + 2, maxDepth + 2) - 2
+        };
+        Result res{};
+        for (std::size_t depth{budget.timed() ? 1 : target}; depth <= target && !aborted; ++depth) {
+            abortable = depth > 1;
+            std::array<float, 4> scores{};
+            Move mxMv{Move::NONE};
+            float mxSc{-1.0f};
+            for (const Move m : {Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT}) {
+                const Grid<N> ns{move(s, m)};
+                if (ns == s) {
+                    continue;
+                }
+                const float v{chanceNode(ns, depth, 1.0f)};
+                scores[static_cast<std::size_t>(m)] = v;
+                if (v > mxSc) {
+                    mxMv = m;
+                    mxSc = v;
+                }
+            }
+            if (aborted) {
+                break;
+            }
+            res.move = mxMv;
+            res.scores = scores;
+            res.depth = depth;
+        }
+        res.iterations = nodes;
+        return res;
+    }
+
+  private:
+    struct Entry {
+        Grid<N> key{};
+        float value{};
+        std::uint16_t depth{};
+        std::uint16_t gen{};
+    };
+
+    static constexpr std::size_t ttBits{18};
+    static constexpr std::size_t ttEntries{1 << ttBits};
+    static constexpr std::size_t minDepth{2};
+    static constexpr std::size_t maxDepth{5};
+    static constexpr std::size_t maxTimedDepth{8};
+    static constexpr std::uint64_t clockInterval{256};
+    static constexpr float probThreshold{1e-4f};
+    std::vector<Entry> table;
+    Weights weights{};
+    std::uint16_t gen{};
+    std::uint64_t nodes{};
+    Clock::time_point deadline{};
+    bool abortable{};
+    bool aborted{};
+
+    Entry &slot(const Grid<N> &s) {
+        std::uint64_t h{};
+        for (const std::uint32_t row : s.rows) {
+            h = (h ^ row) * 0x9E37'79B9'7F4A'7C15ull;
+        }
+        return table[h >> (64 - ttBits)];
+    }
+
+    float heuristic(const Grid<N> &s) const {
+        const Grid<N> t{transpose(s)};
+        std::array<std::uint8_t, N> ln{};
+        float v{};
+        for (const Grid<N> *g : {&s, &t}) {
+            for (std::size_t r{0}; r < N; ++r) {
+                for (std::size_t c{0}; c < N; ++c) {
+                    ln[c] = g->at(r, c);
+                }
+                v += weigh(weights, rowFeatures(ln));
+            }
+        }
+        return v;
+    }
+
+    float maxNode(const Grid<N> &s, const std::size_t depth, const float prob) {
+        float mx{};
+        for (const Move m : {Move::UP, Move::DOWN, Move::LEFT, Move::RIGHT}) {
+            const Grid<N> ns{move(s, m)};
+            if (ns == s) {
+                continue;
+            }
+            mx = std::max(mx, chanceNode(ns, depth - 1, prob));
+        }
+        return mx;
+    }
+
+    float chanceNode(const Grid<N> &s, const std::size_t depth, const float prob) {
+        if (++nodes % clockInterval == 0 && abortable && Clock::now() >= deadline) {
+            aborted = true;
+        }
+        if (aborted) {
+            return 0.0f;
+        }
+        if (depth == 0 || prob < probThreshold) {
+            return heuristic(s);
+        }
+        Entry &e{slot(s)};
+        if (e.gen == gen && e.key == s && e.depth >= depth) {
+            return e.value;
+        }
+        std::size_t cnt{0};
+        for (std::size_t r{0}; r < N; ++r) {
+            for (std::size_t c{0}; c < N; ++c) {
+                cnt += s.at(r, c) == 0;
+            }
+        }
+        const float fcnt{static_cast<float>(cnt)};
+        float v{};
+        for (std::size_t r{0}; r < N; ++r) {
+            for (std::size_t c{0}; c < N; ++c) {
+                if (s.at(r, c) != 0) {
+                    continue;
+                }
+                Grid<N> ns{s};
+                ns.set(r, c, 1);
+                v += maxNode(ns, depth, prob * 0.9f / fcnt) * 0.9f;
+                ns.set(r, c, 2);
+                v += maxNode(ns, depth, prob * 0.1f / fcnt) * 0.1f;
+            }
+        }
+        if (aborted) {
+            return 0.0f;
+        }
+        v /= fcnt;
+        e = Entry{s, v, static_cast<std::uint16_t>(depth), gen};
+        return v;
+    }
+};
+
+template <std::size_t N> Result searchGrid(const std::vector<std::uint32_t> &rstate, const Budget budget) {
+    // One engine per side and calling thread, like expectimax().
+    thread_local GridExpectimax<N> engine{};
+    const Clock::time_point st{Clock::now()};
+    Grid<N> g{};
+    for (std::size_t i{0}; i < rstate.size(); ++i) {
+        g.set(i / N, i % N, rstate[i] != 0 ? std::countr_zero(rstate[i]) : 0);
+    }
+    if (ended(g)) {
+        return Result{};
+    }
+    Result res{engine.search(g, budget)};
+    res.elapsed = std::chrono::duration<double, std::milli>{Clock::now() - st}.count();
+    return res;
+}
+
+} // namespace detail
+
+Result evaluateGrid(const std::vector<std::uint32_t> &rstate, const std::uint8_t type, const double budgetMs) {
+    /*
+        Boards are row-major tile values of any square size from minSide to maxSide.
+        4x4 boards whose tiles fit a nibble are handed to evaluateTimed(), the rest are
+        searched with expectimax whatever the type, MC and MCTS only run on State.
+    */
+    const std::size_t n{static_cast<std::size_t>(std::lround(std::sqrt(static_cast<double>(rstate.size()))))};
+    if (n * n != rstate.size() || n < minSide || n > maxSide) {
+        throw std::invalid_argument("Boards must be square, 3x3 to 6x6.");
+    }
+    if (n == 4 && std::all_of(rstate.begin(), rstate.end(), [](const std::uint32_t t) { return t <= 1u << 15; })) {
+        std::array<std::uint16_t, cellCount> st{};
+        std::copy(rstate.begin(), rstate.end(), st.begin());
+        return evaluateTimed(st, type, budgetMs);
+    }
+    const auto budget{std::chrono::duration_cast<Clock::duration>(std::chrono::duration<double, std::milli>{budgetMs})};
+    const Budget bg{UINT64_MAX, Clock::now() + budget};
+    switch (n) {
+    case 3: return detail::searchGrid<3>(rstate, bg);
+    case 4: return detail::searchGrid<4>(rstate, bg);
+    case 5: return detail::searchGrid<5>(rstate, bg);
+    default: return detail::searchGrid<6>(rstate, bg);
+    }
+}
+
+} // namespace eval2048
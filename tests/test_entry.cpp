@@ -3,5 +3,5 @@
 using namespace eval2048;
 int main() {
     State s{0x0002'1000'0002'0002};
-    monteCarlo(s);
+    monteCarlo(s, Budget{mcSimulations});
 }
\ No newline at end of file